@@ -0,0 +1,37 @@
+"""Module for the roster of polled accounts."""
+import json
+from collections import namedtuple
+
+Account = namedtuple(
+    'Account', ['name', 'token', 'chat_id', 'locale'], defaults=(None,))
+REQUIRED_FIELDS = ('name', 'token', 'chat_id')
+
+
+def auth_headers(token):
+    """Builds the authorization headers for the Practicum API."""
+    return {'Authorization': f'OAuth {token}'}
+
+
+def load_accounts(path):
+    """Reads the roster of accounts from a JSON file.
+
+    The file contains a list of objects with the keys
+    name, token, chat_id and optional locale.
+    """
+    with open(path, encoding='utf-8') as file:
+        roster = json.load(file)
+    if not isinstance(roster, list):
+        raise TypeError('Account roster is not a list')
+    accounts = []
+    names = set()
+    for entry in roster:
+        for key in REQUIRED_FIELDS:
+            if key not in entry:
+                raise KeyError(f'Missing key {key} in account roster')
+        if entry['name'] in names:
+            raise KeyError(f'Duplicate account {entry["name"]}')
+        names.add(entry['name'])
+        accounts.append(Account(
+            str(entry['name']), entry['token'], entry['chat_id'],
+            entry.get('locale')))
+    return accounts
@@ -0,0 +1,442 @@
+"""Module for the Practicum API client."""
+import hashlib
+import json
+import threading
+import time
+from collections import Counter, OrderedDict, namedtuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+from exceptions import (APIRateLimitException, APIValueException,
+                        CircuitOpenException)
+from lazy import lazy_import
+from metrics import Histogram
+
+aiohttp = lazy_import('aiohttp')
+asyncio = lazy_import('asyncio')
+requests = lazy_import('requests')
+
+API_LATENCY = Histogram(
+    'homework_api_request_seconds',
+    'Duration of requests to the Practicum API')
+
+HOMEWORK_FIELDS = (
+    'id', 'homework_name', 'status', 'lesson_name', 'reviewer_comment',
+    'date_updated')
+
+if orjson is not None:
+    JSON_BACKEND, json_loads = 'orjson', orjson.loads
+elif ujson is not None:
+    JSON_BACKEND, json_loads = 'ujson', ujson.loads
+else:
+    JSON_BACKEND, json_loads = 'json', json.loads
+
+Validators = namedtuple(
+    'Validators', ['from_date', 'etag', 'last_modified', 'digest', 'size',
+                   'data'])
+
+
+def project_response(data):
+    """Keeps only the answer fields used by the bot.
+
+    Homeworks are reduced to HOMEWORK_FIELDS, so cached answers
+    do not hold the rest of the payload. Answers of an unexpected
+    shape are returned as they are for check_response to reject.
+    """
+    if not isinstance(data, dict):
+        return data
+    homeworks = data.get('homeworks')
+    if not isinstance(homeworks, list):
+        return data
+    projected = {'homeworks': [
+        {field: homework[field]
+         for field in HOMEWORK_FIELDS if field in homework}
+        if isinstance(homework, dict) else homework
+        for homework in homeworks
+    ]}
+    if 'current_date' in data:
+        projected['current_date'] = data['current_date']
+    return projected
+
+
+def create_session(pool_size=10):
+    """Creates a session keeping up to pool_size open connections."""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+class CircuitBreaker:
+    """Stops requests to the API after repeated failures.
+
+    After failure_threshold failures in a row the circuit opens and
+    requests are refused. When recovery_time passes, one probe
+    request is let through: its success closes the circuit and its
+    failure opens it again.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold=5, recovery_time=60,
+                 clock=time.monotonic):
+        """Starts with the circuit closed."""
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = None
+
+    def allow(self):
+        """Tells whether a request may be sent now."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and (
+                    self._clock() - self._opened_at >= self.recovery_time):
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        """Closes the circuit after a successful request."""
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        """Counts a failed request and opens the circuit if needed."""
+        with self._lock:
+            self.failures += 1
+            if (self.state == self.HALF_OPEN
+                    or self.failures >= self.failure_threshold):
+                self.state = self.OPEN
+                self._opened_at = self._clock()
+
+
+class SingleFlight:
+    """Lets concurrent calls with the same key share one execution."""
+
+    def __init__(self):
+        """Starts with no running calls."""
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, function):
+        """Calls the function unless a call with the key is running.
+
+        Returns the result and whether it was taken from another call.
+        Errors are passed to every waiting caller.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {'done': threading.Event()}
+        if not leader:
+            call['done'].wait()
+            if 'error' in call:
+                raise call['error']
+            return call['result'], True
+        try:
+            call['result'] = function()
+            return call['result'], False
+        except BaseException as error:
+            call['error'] = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call['done'].set()
+
+
+class TTLCache:
+    """Keeps up to size recent values for ttl seconds."""
+
+    def __init__(self, ttl, size, clock=time.monotonic):
+        """Creates an empty cache."""
+        self.ttl = ttl
+        self.size = size
+        self._clock = clock
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Returns the value if it has not expired yet, otherwise None."""
+        if not self.ttl:
+            return None
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires <= self._clock():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        """Saves the value, evicting the least recently used one."""
+        if not self.ttl:
+            return
+        with self._lock:
+            self._items[key] = (self._clock() + self.ttl, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+
+def parse_retry_after(value):
+    """Converts the Retry-After header to a number of seconds."""
+    if value is None:
+        return None
+    try:
+        return max(0, int(value))
+    except ValueError:
+        pass
+    from email.utils import parsedate_to_datetime
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0, date.timestamp() - time.time())
+
+
+# Outcomes of fetch counted in stats, every answered call has exactly one.
+POLL_RESULTS = (
+    'cache_hits', 'coalesced', 'not_modified', 'unchanged_body', 'changed')
+
+
+class PracticumClient:
+    """Client of the homework statuses endpoint.
+
+    Requests go through session. Without a session every call
+    is made with requests.get and opens a new connection.
+    The last answer of every account is remembered, so repeated
+    polls are sent as conditional requests and identical bodies
+    are not decoded again. stats counts the saved work.
+    fetch_async does the same through an aiohttp session, sharing
+    the remembered answers, cache, stats and breaker with fetch.
+    Server errors and requests that got no answer for any reason
+    are reported to breaker, which suspends requests while the API
+    is down.
+    """
+
+    def __init__(self, endpoint, session=None, timeout=None, breaker=None,
+                 cache_ttl=0, cache_size=1024):
+        """Falls back to requests when no session is given."""
+        self.endpoint = endpoint
+        self.session = session if session is not None else requests
+        self.timeout = timeout
+        self.breaker = breaker
+        self.cache = TTLCache(cache_ttl, cache_size)
+        self.flights = SingleFlight()
+        self.stats = Counter()
+        self._validators = {}
+        self._tasks = {}
+
+    def get_homeworks(self, headers, current_timestamp):
+        """Requests the homework statuses changed since the timestamp."""
+        return self.fetch(headers, current_timestamp)[0]
+
+    def fetch(self, headers, current_timestamp):
+        """Requests the homework statuses changed since the timestamp.
+
+        Returns the answer and a flag that is false when the answer
+        is the same as the previous one for this account.
+        Concurrent identical requests share one call, and its result
+        is reused for cache_ttl seconds.
+        """
+        timestamp = current_timestamp
+        if timestamp is None:
+            timestamp = int(time.time())
+        key = (headers.get('Authorization'), timestamp)
+        result = self.cache.get(key)
+        if result is not None:
+            self.stats['cache_hits'] += 1
+            return result
+        result, shared = self.flights.do(
+            key, lambda: self._fetch(headers, timestamp))
+        if shared:
+            self.stats['coalesced'] += 1
+        else:
+            self.cache.put(key, result)
+        return result
+
+    async def fetch_async(self, session, headers, current_timestamp):
+        """Requests the homework statuses without blocking the loop.
+
+        Works like fetch, with concurrent identical requests sharing
+        one task.
+        """
+        timestamp = current_timestamp
+        if timestamp is None:
+            timestamp = int(time.time())
+        key = (headers.get('Authorization'), timestamp)
+        result = self.cache.get(key)
+        if result is not None:
+            self.stats['cache_hits'] += 1
+            return result
+        task = self._tasks.get(key)
+        if task is not None:
+            self.stats['coalesced'] += 1
+            return await asyncio.shield(task)
+        task = self._tasks[key] = asyncio.ensure_future(
+            self._fetch_async(session, headers, timestamp))
+        try:
+            result = await asyncio.shield(task)
+        finally:
+            del self._tasks[key]
+        self.cache.put(key, result)
+        return result
+
+    def forget(self, headers):
+        """Drops the remembered answer of the account.
+
+        Called when the answer could not be processed, so the next
+        identical answer is reported as changed and processed again.
+        """
+        self._validators.pop(headers.get('Authorization'), None)
+
+    def _fetch(self, headers, timestamp):
+        key = headers.get('Authorization')
+        cached = self._validators.get(key)
+        response = self._request(
+            self._conditional_headers(headers, cached, timestamp), timestamp)
+        content = getattr(response, 'content', None)
+        if content is None and response.status_code == 200:
+            # Answers without a body are only decoded, as in old mocks.
+            try:
+                data = project_response(response.json())
+            except ValueError:
+                raise APIValueException(
+                    'Problem with converting from JSON API response')
+            self.stats['changed'] += 1
+            return data, True
+        return self._answer(
+            key, cached, timestamp, response.status_code,
+            getattr(response, 'headers', {}), content)
+
+    async def _fetch_async(self, session, headers, timestamp):
+        key = headers.get('Authorization')
+        cached = self._validators.get(key)
+        status, response_headers, content = await self._request_async(
+            session, self._conditional_headers(headers, cached, timestamp),
+            timestamp)
+        return self._answer(
+            key, cached, timestamp, status, response_headers, content)
+
+    def _answer(self, key, cached, timestamp, status, headers, content):
+        """Returns the data of the answer and whether it has changed."""
+        if status == 304 and cached is not None:
+            self.stats['not_modified'] += 1
+            self.stats['bytes_saved'] += cached.size
+            return cached.data, False
+        if status != 200:
+            self._raise_for_status(status, headers)
+        digest = hashlib.blake2b(content, digest_size=16).digest()
+        if cached is not None and cached.digest == digest:
+            self.stats['unchanged_body'] += 1
+            return cached.data, False
+        try:
+            data = project_response(json_loads(content))
+        except ValueError:
+            raise APIValueException(
+                'Problem with converting from JSON API response')
+        self._validators[key] = Validators(
+            timestamp, headers.get('ETag'), headers.get('Last-Modified'),
+            digest, len(content), data)
+        self.stats['changed'] += 1
+        return data, True
+
+    def _request(self, headers, timestamp):
+        """Sends the request, passing its outcome to the breaker."""
+        if self.breaker is not None and not self.breaker.allow():
+            raise CircuitOpenException(
+                f'API requests suspended: circuit {self.breaker.state}')
+        response = None
+        try:
+            with API_LATENCY.time():
+                response = self.session.get(
+                    url=self.endpoint, headers=headers,
+                    params={'from_date': timestamp}, timeout=self.timeout)
+        except requests.ConnectionError:
+            raise ConnectionError('Server is not available')
+        except requests.Timeout:
+            raise TimeoutError('Server did not respond in time')
+        finally:
+            self._record(
+                response is not None and response.status_code < 500)
+        self.stats['requests'] += 1
+        return response
+
+    async def _request_async(self, session, headers, timestamp):
+        """Sends the request on the event loop like _request.
+
+        Returns the status, headers and body of the answer.
+        """
+        if self.breaker is not None and not self.breaker.allow():
+            raise CircuitOpenException(
+                f'API requests suspended: circuit {self.breaker.state}')
+        status = None
+        try:
+            with API_LATENCY.time():
+                async with session.get(
+                        self.endpoint, headers=headers,
+                        params={'from_date': timestamp}) as response:
+                    status = response.status
+                    response_headers = response.headers
+                    content = await response.read()
+        except aiohttp.ClientConnectionError:
+            raise ConnectionError('Server is not available')
+        except asyncio.TimeoutError:
+            raise TimeoutError('Server did not respond in time')
+        finally:
+            self._record(status is not None and status < 500)
+        self.stats['requests'] += 1
+        return status, response_headers, content
+
+    def _record(self, success):
+        if self.breaker is None:
+            return
+        if success:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+
+    @staticmethod
+    def _raise_for_status(status, headers):
+        """Raises the error for an answer other than 200."""
+        message = f'API not available: error {status}'
+        retry_after = parse_retry_after(headers.get('Retry-After'))
+        if retry_after is not None:
+            raise APIRateLimitException(message, retry_after)
+        raise APIValueException(message)
+
+    @staticmethod
+    def _conditional_headers(headers, cached, timestamp):
+        """Adds the validators of the previous answer to the headers."""
+        if cached is None or cached.from_date != timestamp:
+            return headers
+        if cached.etag is None and cached.last_modified is None:
+            return headers
+        headers = dict(headers)
+        if cached.etag is not None:
+            headers['If-None-Match'] = cached.etag
+        if cached.last_modified is not None:
+            headers['If-Modified-Since'] = cached.last_modified
+        return headers
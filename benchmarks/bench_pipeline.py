@@ -0,0 +1,212 @@
+"""Benchmarks of the poll, parse and notify pipeline.
+
+The Practicum API and Telegram are replaced with MockResponseGET
+and MockTelegramBot from the tests. Run from the repository root:
+
+    python benchmarks/bench_pipeline.py --output bench.json
+    python benchmarks/bench_pipeline.py --compare bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+from http import HTTPStatus
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [
+    ROOT, os.path.join(ROOT, 'tests'), os.path.join(ROOT, 'benchmarks')]
+os.environ.setdefault('LOG_LEVEL', 'CRITICAL')
+os.environ.setdefault('LOG_FILE', '')
+
+import homework  # noqa: E402
+from accounts import Account  # noqa: E402
+from api_client import CircuitBreaker  # noqa: E402
+from fanout import FanOut, Subscriptions  # noqa: E402
+from outbox import Outbox  # noqa: E402
+from report import git_commit  # noqa: E402
+from state import MemoryStateStore  # noqa: E402
+from test_bot import MockResponseGET, MockTelegramBot  # noqa: E402
+
+STATUSES = list(homework.HOMEWORK_STATUSES)
+
+
+def make_homeworks(count, rng):
+    """Creates a list of homeworks as the API returns them."""
+    return [{
+        'id': number,
+        'status': rng.choice(STATUSES),
+        'homework_name': f'student__hw{number:05d}.zip',
+        'reviewer_comment': 'Good job! ' * rng.randint(1, 20),
+        'date_updated': '2022-02-13T14:40:57Z',
+        'lesson_name': f'Lesson {number}',
+    } for number in range(count)]
+
+
+class SimulatedAPI:
+    """Replacement of the session answering with MockResponseGET.
+
+    The answers carry a JSON body in content, as requests responses
+    do, so the client decodes and compares them as in production.
+    The body is encoded once per second of current_date.
+    """
+
+    def __init__(self, homeworks, latency=0, error_rate=0, rng=None):
+        self.homeworks = homeworks
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rng = rng or random.Random()
+        self._body = (None, b'')
+
+    def body(self, current_date):
+        """Returns the encoded answer for current_date."""
+        if self._body[0] != current_date:
+            data = {'homeworks': self.homeworks, 'current_date': current_date}
+            self._body = (current_date, json.dumps(data).encode())
+        return self._body[1]
+
+    def get(self, **kwargs):
+        """Answers like the homework statuses endpoint."""
+        if self.latency:
+            time.sleep(self.latency)
+        status = HTTPStatus.OK
+        if self.rng.random() < self.error_rate:
+            status = HTTPStatus.INTERNAL_SERVER_ERROR
+        current_date = int(time.time())
+        response = MockResponseGET(
+            random_timestamp=current_date,
+            current_timestamp=kwargs['params']['from_date'],
+            http_status=status, **kwargs)
+        response.content = self.body(current_date)
+        response.json = lambda: json.loads(response.content)
+        return response
+
+
+def percentile(values, share):
+    """Returns the value below which the given share of values lies."""
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+def measure(name, accounts, calls, function):
+    """Calls the function and returns its throughput and latencies."""
+    latencies = []
+    errors = 0
+    started = time.perf_counter()
+    for number in range(calls):
+        start = time.perf_counter()
+        try:
+            function(number)
+        except Exception:
+            errors += 1
+        latencies.append(time.perf_counter() - start)
+    total = time.perf_counter() - started
+    return {
+        'name': name,
+        'accounts': accounts,
+        'calls': calls,
+        'errors': errors,
+        'throughput': calls / total,
+        'p50': percentile(latencies, 0.5),
+        'p99': percentile(latencies, 0.99),
+    }
+
+
+def run(accounts_count, api, homeworks):
+    """Benchmarks every stage for the given number of accounts."""
+    homework.api_client.session = api
+    homework.api_client.breaker = CircuitBreaker(float('inf'))
+    homework.api_client.cache.ttl = 0
+    accounts = [
+        Account(f'student{number}', f'token{number}', number)
+        for number in range(accounts_count)
+    ]
+    bot = MockTelegramBot(token='1234:abcdefg')
+    outbox = Outbox(
+        lambda chat_id, text: bot.send_message(chat_id=chat_id, text=text),
+        global_rate=float('inf'), chat_rate=float('inf'))
+    fanout = FanOut(outbox, Subscriptions(), {})
+    store = MemoryStateStore()
+    policy = homework.create_policy()
+    homework.start_cursors(store, accounts)
+    response = {'homeworks': homeworks, 'current_date': int(time.time())}
+    results = [
+        measure('get_api_answer', accounts_count, accounts_count,
+                lambda number: homework.get_api_answer(
+                    store.get_cursor(accounts[number].name))),
+        measure('check_response', accounts_count, accounts_count,
+                lambda number: homework.check_response(response)),
+        measure('parse_status', accounts_count, accounts_count,
+                lambda number: homework.parse_status(
+                    homeworks[number % len(homeworks)])),
+        measure('poll_iteration', accounts_count, accounts_count,
+                lambda number: homework.poll_account(
+                    fanout, accounts[number], store, policy)),
+    ]
+    if len(outbox):
+        results.append(measure(
+            'send_message', accounts_count, len(outbox),
+            lambda number: outbox.send_next()))
+    store.flush(force=True)
+    return results
+
+
+def compare(report, baseline):
+    """Prints the change of every result against the baseline."""
+    old = {(item['name'], item['accounts']): item
+           for item in baseline['results']}
+    print(f'{"stage":<16}{"accounts":>9}{"p50 us":>10}{"p99 us":>10}'
+          f'{"throughput":>12}{"change":>9}')
+    for item in report['results']:
+        previous = old.get((item['name'], item['accounts']))
+        change = ''
+        if previous:
+            change = f'{item["throughput"] / previous["throughput"] - 1:+.0%}'
+        print(f'{item["name"]:<16}{item["accounts"]:>9}'
+              f'{item["p50"] * 1e6:>10.1f}{item["p99"] * 1e6:>10.1f}'
+              f'{item["throughput"]:>12.0f}{change:>9}')
+
+
+def main():
+    """Runs the benchmarks and saves the report."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--accounts', type=int, nargs='+',
+                        default=[1, 100, 10000])
+    parser.add_argument('--homeworks', type=int, default=3,
+                        help='homeworks in every API answer')
+    parser.add_argument('--latency', type=float, default=0,
+                        help='simulated API latency in seconds')
+    parser.add_argument('--error-rate', type=float, default=0,
+                        help='share of API answers with error 500')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='file to save the JSON report')
+    parser.add_argument('--compare', help='JSON report to compare with')
+    args = parser.parse_args()
+
+    homework.create_app()
+    rng = random.Random(args.seed)
+    homeworks = make_homeworks(args.homeworks, rng)
+    api = SimulatedAPI(homeworks, args.latency, args.error_rate, rng)
+    report = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'created': int(time.time()),
+        'parameters': vars(args),
+        'results': [],
+    }
+    for accounts_count in args.accounts:
+        report['results'] += run(accounts_count, api, homeworks)
+    baseline = {'results': []}
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            baseline = json.load(file)
+    compare(report, baseline)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
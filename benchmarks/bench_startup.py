@@ -0,0 +1,177 @@
+"""Benchmarks of the cold start of the bot.
+
+Measures the import time of homework with an import-time profile,
+the time from the start of the worker to its first poll and the
+time of one-shot commands. The Practicum API is served by
+FakeServer. Run from the repository root:
+
+    python benchmarks/bench_startup.py --output startup.json
+    python benchmarks/bench_startup.py --compare startup.json
+"""
+import argparse
+import json
+import os
+import platform
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_server import FakeServer  # noqa: E402
+from report import git_commit  # noqa: E402
+
+FIRST_POLL_TIMEOUT = 30
+
+
+def import_profile(runs):
+    """Imports homework in fresh interpreters with -X importtime.
+
+    Returns the median import time in seconds and the self time
+    of every module from the last run.
+    """
+    totals = []
+    modules = {}
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', 'import homework'],
+            cwd=ROOT, capture_output=True, text=True, check=True)
+        modules = {}
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+            own, cumulative, name = line[len('import time:'):].split('|')
+            modules[name.strip()] = int(own) / 1e6
+            if name.strip() == 'homework':
+                totals.append(int(cumulative) / 1e6)
+    return statistics.median(totals), modules
+
+
+def bot_environment(server, directory):
+    """Returns the variables running the bot against the fake server."""
+    roster = os.path.join(directory, 'accounts.json')
+    with open(roster, 'w', encoding='utf-8') as file:
+        json.dump([{'name': 'student', 'token': 'token', 'chat_id': 1}], file)
+    return {
+        **os.environ,
+        'ACCOUNTS_FILE': roster,
+        'TELEGRAM_TOKEN': '1234:abcdefg',
+        'PRACTICUM_ENDPOINT':
+            f'{server.url}/api/user_api/homework_statuses/',
+        'TELEGRAM_API_URL': server.url,
+        'LOG_LEVEL': 'CRITICAL',
+        'LOG_FILE': '',
+    }
+
+
+def first_poll(server, environment, extra):
+    """Starts the worker and returns the seconds until its first poll."""
+    polls = server.stats['homework_statuses']
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, 'homework.py'], cwd=ROOT,
+        env={**environment, **extra}, stdout=subprocess.DEVNULL)
+    try:
+        while server.stats['homework_statuses'] == polls:
+            if time.perf_counter() - started > FIRST_POLL_TIMEOUT:
+                raise TimeoutError('The worker did not poll the API')
+            if process.poll() is not None:
+                raise RuntimeError('The worker exited before the first poll')
+            time.sleep(0.001)
+        return time.perf_counter() - started
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait()
+
+
+def command(environment, arguments):
+    """Runs a one-shot command and returns its duration in seconds."""
+    started = time.perf_counter()
+    subprocess.run(
+        [sys.executable, 'homework.py', *arguments], cwd=ROOT,
+        env=environment, stdout=subprocess.DEVNULL, check=True)
+    return time.perf_counter() - started
+
+
+def measure(name, runs, function):
+    """Runs function several times and describes its durations."""
+    durations = [function() for _ in range(runs)]
+    return {
+        'name': name,
+        'median': statistics.median(durations),
+        'min': min(durations),
+    }
+
+
+def compare(report, baseline):
+    """Prints the change of every result against the baseline."""
+    old = {item['name']: item for item in baseline['results']}
+    print(f'{"stage":<20}{"median ms":>11}{"min ms":>9}{"change":>9}')
+    for item in report['results']:
+        previous = old.get(item['name'])
+        change = ''
+        if previous:
+            change = f'{item["median"] / previous["median"] - 1:+.0%}'
+        print(f'{item["name"]:<20}{item["median"] * 1e3:>11.1f}'
+              f'{item["min"] * 1e3:>9.1f}{change:>9}')
+
+
+def main():
+    """Runs the benchmarks and saves the report."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15,
+                        help='number of the slowest modules to show')
+    parser.add_argument('--output', help='file to save the JSON report')
+    parser.add_argument('--compare', help='JSON report to compare with')
+    args = parser.parse_args()
+
+    import_time, modules = import_profile(args.runs)
+    server = FakeServer(('127.0.0.1', 0)).start()
+    report = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'created': int(time.time()),
+        'parameters': vars(args),
+        'results': [
+            {'name': 'import homework', 'median': import_time,
+             'min': import_time},
+        ],
+        'modules': modules,
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        environment = bot_environment(server, directory)
+        report['results'] += [
+            measure('first poll', args.runs,
+                    lambda: first_poll(server, environment, {})),
+            measure('first poll async', args.runs,
+                    lambda: first_poll(
+                        server, environment, {'ASYNC_POLLING': '1'})),
+            measure('replay --dry-run', args.runs,
+                    lambda: command(
+                        {**environment, 'JOURNAL_DIR': directory},
+                        ['replay', '--dry-run'])),
+            measure('import', args.runs,
+                    lambda: command(environment, ['import'])),
+        ]
+    server.stop()
+    baseline = {'results': []}
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            baseline = json.load(file)
+    compare(report, baseline)
+    print(f'\n{"module":<40}{"self ms":>9}')
+    for name, seconds in sorted(
+            modules.items(), key=lambda item: -item[1])[:args.top]:
+        print(f'{name:<40}{seconds * 1e3:>9.1f}')
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
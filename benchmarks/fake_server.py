@@ -0,0 +1,226 @@
+r"""Local stand-in for the Practicum API and the Telegram Bot API.
+
+Point the bot at it to run the real main() without the network:
+
+    python benchmarks/fake_server.py --port 8080 --error-rate 0.01
+    PRACTICUM_ENDPOINT=http://127.0.0.1:8080/api/user_api/homework_statuses/ \\
+    TELEGRAM_API_URL=http://127.0.0.1:8080 python homework.py
+
+The scenario file is a JSON list of answers returned to every token
+in turn, e.g. [{"homeworks": []}, {"homeworks": [{"id": 1,
+"homework_name": "hw1", "status": "reviewing"}]}]. A missing
+current_date is replaced with the current time.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+HOMEWORK_PATH = '/api/user_api/homework_statuses/'
+DEFAULT_SCENARIO = [{'homeworks': []}]
+
+
+class FakeServer(ThreadingHTTPServer):
+    """Server answering like the Practicum API and Telegram."""
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address, scenario=None, latency=0, error_rate=0,
+                 rate_limit_rate=0, malformed_rate=0, seed=None):
+        super().__init__(address, FakeHandler)
+        self.scenario = scenario or DEFAULT_SCENARIO
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.malformed_rate = malformed_rate
+        self.rng = random.Random(seed)
+        self.stats = Counter()
+        self.messages = []
+        self.positions = {}
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        """Base URL of the server."""
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        """Serves requests from a background thread."""
+        threading.Thread(
+            target=self.serve_forever, name='fake-server',
+            daemon=True).start()
+        return self
+
+    def stop(self):
+        """Stops serving and closes the socket."""
+        self.shutdown()
+        self.server_close()
+
+    def next_answer(self, token):
+        """Returns the next answer of the scenario for the token."""
+        with self.lock:
+            position = self.positions.get(token, 0)
+            self.positions[token] = position + 1
+        answer = dict(self.scenario[position % len(self.scenario)])
+        answer.setdefault('current_date', int(time.time()))
+        return answer
+
+    def choose_failure(self):
+        """Returns the injected failure for the request or None."""
+        with self.lock:
+            roll = self.rng.random()
+        for failure, rate in (('error', self.error_rate),
+                              ('rate_limit', self.rate_limit_rate),
+                              ('malformed', self.malformed_rate)):
+            if roll < rate:
+                return failure
+            roll -= rate
+        return None
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    """Handler of the fake endpoints."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        """Serves the API and the statistics."""
+        url = urlparse(self.path)
+        if url.path == HOMEWORK_PATH:
+            self.homework_statuses(parse_qs(url.query))
+        elif url.path == '/stats':
+            self.reply(200, dict(self.server.stats))
+        elif url.path.endswith('/getUpdates'):
+            self.reply(200, {'ok': True, 'result': []})
+        else:
+            self.reply(404, {'error': 'Not found'})
+
+    def do_POST(self):
+        """Serves the Telegram methods."""
+        path = urlparse(self.path).path
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length).decode()
+        if path.endswith('/sendMessage'):
+            self.send_message(body)
+        elif path.endswith('/getUpdates'):
+            self.get_updates(body)
+        else:
+            self.reply(404, {'ok': False, 'description': 'Not Found'})
+
+    def homework_statuses(self, query):
+        """Answers like the homework statuses endpoint."""
+        server = self.server
+        server.stats['homework_statuses'] += 1
+        if server.latency:
+            time.sleep(server.latency)
+        token = self.headers.get('Authorization', '')
+        if not token.startswith('OAuth ') or 'from_date' not in query:
+            server.stats['bad_request'] += 1
+            self.reply(400, {'code': 'bad_request'})
+            return
+        failure = server.choose_failure()
+        if failure:
+            server.stats[failure] += 1
+        if failure == 'error':
+            self.reply(500, {'code': 'internal_error'})
+        elif failure == 'rate_limit':
+            self.reply(429, {'code': 'too_many_requests'},
+                       {'Retry-After': '1'})
+        elif failure == 'malformed':
+            self.reply_raw(200, b'{"homeworks": [')
+        else:
+            self.reply(200, server.next_answer(token))
+
+    def send_message(self, body):
+        """Accepts a message like the sendMessage method."""
+        server = self.server
+        server.stats['sendMessage'] += 1
+        try:
+            data = json.loads(body)
+        except json.JSONDecodeError:
+            data = {key: values[0] for key, values in parse_qs(body).items()}
+        if 'chat_id' not in data or 'text' not in data:
+            self.reply(400, {'ok': False, 'error_code': 400,
+                             'description': 'Bad Request: message text '
+                                            'is empty'})
+            return
+        with server.lock:
+            server.messages.append((data['chat_id'], data['text']))
+            message_id = len(server.messages)
+        self.reply(200, {'ok': True, 'result': {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': int(data['chat_id']), 'type': 'private'},
+            'text': data['text'],
+        }})
+
+    def get_updates(self, body):
+        """Answers long polling with no updates after a short wait."""
+        self.server.stats['getUpdates'] += 1
+        try:
+            timeout = float(json.loads(body or '{}').get('timeout') or 0)
+        except (json.JSONDecodeError, ValueError):
+            timeout = 0
+        time.sleep(min(timeout, 1))
+        self.reply(200, {'ok': True, 'result': []})
+
+    def reply(self, status, data, headers=None):
+        """Sends the data as JSON."""
+        self.reply_raw(status, json.dumps(data).encode(), headers)
+
+    def reply_raw(self, status, body, headers=None):
+        """Sends the body as it is."""
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Keeps the output clean."""
+        pass
+
+
+def main():
+    """Runs the server until interrupted."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--scenario', help='JSON file with API answers')
+    parser.add_argument('--latency', type=float, default=0,
+                        help='delay of API answers in seconds')
+    parser.add_argument('--error-rate', type=float, default=0,
+                        help='share of answers with error 500')
+    parser.add_argument('--rate-limit-rate', type=float, default=0,
+                        help='share of answers with error 429')
+    parser.add_argument('--malformed-rate', type=float, default=0,
+                        help='share of answers with broken JSON')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+    scenario = None
+    if args.scenario:
+        with open(args.scenario, encoding='utf-8') as file:
+            scenario = json.load(file)
+    server = FakeServer(
+        (args.host, args.port), scenario, args.latency, args.error_rate,
+        args.rate_limit_rate, args.malformed_rate, args.seed)
+    print(f'Serving on {server.url}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(dict(server.stats)))
+
+
+if __name__ == '__main__':
+    main()
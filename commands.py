@@ -0,0 +1,90 @@
+"""Module for answering chat commands from the polling process."""
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class TransitionHistory:
+    """Keeps the latest status transitions of every account."""
+
+    def __init__(self, size=20):
+        """Keeps up to size transitions of every account."""
+        self.size = size
+        self._items = {}
+
+    def add(self, account, transitions, received_at=None):
+        """Remembers the transitions received for the account."""
+        if not transitions:
+            return
+        received_at = received_at or time.time()
+        items = self._items.get(account)
+        if items is None:
+            items = self._items[account] = deque(maxlen=self.size)
+        items.extend((received_at, transition) for transition in transitions)
+
+    def get(self, account):
+        """Returns (received_at, transition) pairs, oldest first."""
+        return list(self._items.get(account, ()))
+
+
+class CommandListener:
+    """Receives commands with getUpdates long polling.
+
+    handlers map a command such as /status to a function taking
+    the chat id and returning the answer, which is passed to reply
+    together with the chat id.
+    """
+
+    def __init__(self, bot, handlers, reply, timeout=30, retry_time=5):
+        """Prepares the listener; start runs it."""
+        self.bot = bot
+        self.handlers = handlers
+        self.reply = reply
+        self.timeout = timeout
+        self.retry_time = retry_time
+        self.offset = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Starts receiving commands in a background thread."""
+        self._thread = threading.Thread(
+            target=self._run, name='commands', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """Stops receiving commands."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def poll(self):
+        """Receives one batch of updates and answers the commands."""
+        updates = self.bot.get_updates(
+            offset=self.offset, timeout=self.timeout,
+            allowed_updates=['message'])
+        for update in updates:
+            self.offset = update.update_id + 1
+            message = update.message
+            if message is not None and message.text:
+                self.handle(message.chat_id, message.text)
+
+    def handle(self, chat_id, text):
+        """Answers the command in the text if it is known."""
+        command = text.split()[0].split('@')[0].lower()
+        handler = self.handlers.get(command)
+        if handler is None:
+            return
+        logger.info(f'Command {command} from chat {chat_id}')
+        self.reply(chat_id, handler(chat_id))
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.poll()
+            except Exception as error:
+                logger.error(f'Problems receiving Telegram commands: {error}')
+                self._stop.wait(self.retry_time)
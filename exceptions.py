@@ -5,3 +5,17 @@ class APIValueException(Exception):
     """Error if API is not available."""
 
     pass
+
+
+class APIRateLimitException(APIValueException):
+    """Error if API asks to repeat the request later."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitOpenException(APIValueException):
+    """Error if requests to API are suspended after failures."""
+
+    pass
@@ -0,0 +1,162 @@
+"""Module for delivering homework messages to many destinations."""
+import json
+import threading
+import time
+
+from outbox import STATUS_PRIORITY, Outbox
+
+TELEGRAM = 'telegram'
+WEBHOOK = 'webhook'
+FILE = 'file'
+KINDS = (TELEGRAM, WEBHOOK, FILE)
+
+
+def parse_destination(spec):
+    """Splits a destination like webhook:http://host/path.
+
+    Returns the kind of the destination and its target.
+    """
+    kind, separator, target = str(spec).partition(':')
+    if not separator or not target or kind not in KINDS:
+        raise ValueError(f'Unknown destination {spec}')
+    return kind, target
+
+
+class Subscriptions:
+    """Keeps the destinations subscribed to the messages of accounts.
+
+    The key * subscribes a destination to every account.
+    """
+
+    def __init__(self):
+        """Starts with no subscriptions."""
+        self._destinations = {}
+
+    def load(self, path):
+        """Replaces the subscriptions with the ones from a JSON file.
+
+        The file maps account names to lists of destinations.
+        """
+        with open(path, encoding='utf-8') as file:
+            subscriptions = json.load(file)
+        self._destinations = {
+            name: [parse_destination(spec) for spec in specs]
+            for name, specs in subscriptions.items()
+        }
+        return self
+
+    def destinations(self, name):
+        """Returns the destinations subscribed to the account."""
+        found = []
+        for destination in (self._destinations.get(name, [])
+                            + self._destinations.get('*', [])):
+            if destination not in found:
+                found.append(destination)
+        return found
+
+
+class WebhookSink:
+    """Posts messages as JSON to webhook URLs."""
+
+    def __init__(self, session, timeout=10):
+        """Posts through session with timeout seconds."""
+        self.session = session
+        self.timeout = timeout
+
+    def __call__(self, url, text):
+        """Posts one message to the URL."""
+        response = self.session.post(
+            url, json={'text': text}, timeout=self.timeout)
+        response.raise_for_status()
+
+
+class FileSink:
+    """Appends messages to local files as JSON lines."""
+
+    def __init__(self, clock=time.time):
+        """Stamps the lines with the time of clock."""
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def __call__(self, path, text):
+        """Appends one message to the file."""
+        line = json.dumps(
+            {'time': self._clock(), 'text': text}, ensure_ascii=False)
+        with self._lock, open(path, 'a', encoding='utf-8') as file:
+            file.write(f'{line}\n')
+
+
+class FanOut:
+    """Sends every status message of an account to its subscribers.
+
+    The message is rendered once. Telegram chats share the outbox
+    of the bot and its rate limits; every other destination gets
+    its own outbox and thread, so a slow or failing subscriber
+    does not delay the rest. Subscribers get the message prefixed
+    with the name of the account.
+    """
+
+    def __init__(self, outbox, subscriptions, sinks, rate=10):
+        """Creates the queues of the sinks on first use."""
+        self.outbox = outbox
+        self.subscriptions = subscriptions
+        self.sinks = sinks
+        self.rate = rate
+        self._outboxes = {}
+        self._lock = threading.Lock()
+        self._started = False
+
+    def __len__(self):
+        """Returns the number of messages in all queues."""
+        with self._lock:
+            outboxes = list(self._outboxes.values())
+        return len(self.outbox) + sum(len(outbox) for outbox in outboxes)
+
+    def put(self, chat_id, text, priority=STATUS_PRIORITY):
+        """Sends a message to one Telegram chat."""
+        self.outbox.put(chat_id, text, priority)
+
+    def publish(self, account, text):
+        """Sends a status message to the account and its subscribers."""
+        self.outbox.put(account.chat_id, text)
+        shared = f'{account.name}: {text}'
+        for kind, target in self.subscriptions.destinations(account.name):
+            self._outbox_for(kind, target).put(target, shared)
+
+    def start(self):
+        """Starts the sending threads."""
+        with self._lock:
+            self._started = True
+            outboxes = [self.outbox, *self._outboxes.values()]
+        for outbox in outboxes:
+            outbox.start()
+
+    def stop(self, timeout=None):
+        """Sends the queued messages within one timeout for all outboxes.
+
+        Returns the number of messages left unsent.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            outboxes = [self.outbox, *self._outboxes.values()]
+        left = 0
+        for outbox in outboxes:
+            remaining = None
+            if deadline is not None:
+                remaining = max(0, deadline - time.monotonic())
+            left += outbox.stop(remaining)
+        return left
+
+    def _outbox_for(self, kind, target):
+        if kind == TELEGRAM:
+            return self.outbox
+        with self._lock:
+            outbox = self._outboxes.get((kind, target))
+            if outbox is None:
+                outbox = Outbox(
+                    self.sinks[kind], self.rate, self.rate,
+                    name=f'{kind}:{target}')
+                self._outboxes[(kind, target)] = outbox
+                if self._started:
+                    outbox.start()
+            return outbox
@@ -1,73 +1,222 @@
-import json
+import argparse
+import atexit
+import functools
+import itertools
 import logging
 import os
 import sys
+import threading
 import time
+from datetime import datetime
 
-import requests
-import telegram
 from dotenv import load_dotenv
 
-from exceptions import APIValueException
+from accounts import Account, auth_headers, load_accounts
+from api_client import (POLL_RESULTS, CircuitBreaker, PracticumClient,
+                        create_session)
+from commands import CommandListener, TransitionHistory
+from exceptions import APIRateLimitException
+from fanout import FILE, WEBHOOK, FanOut, FileSink, Subscriptions, WebhookSink
+from importer import bounded_map
+from journal import Journal
+from lazy import lazy_import
+from lifecycle import Lifecycle
+from logging_setup import setup_logging
+from metrics import Counter, Gauge, Histogram, start_metrics_server
+from outbox import ERROR_PRIORITY, Outbox
+from scheduler import AdaptivePolicy, PollScheduler
+from sharding import claim_worker_index, shard_accounts
+from state import open_state_store
+from templates import TemplateRegistry
+from tracing import JsonFileExporter, OTLPExporter, Tracer
+from transitions import apply_transitions, find_transitions, replay
 
-load_dotenv()
+asyncio = lazy_import('asyncio')
+aiohttp = lazy_import('aiohttp')
+telegram = lazy_import('telegram')
 
-
-PRACTICUM_TOKEN = os.getenv('PRACTICUM_TOKEN')
-TELEGRAM_TOKEN = os.getenv('TELEGRAM_TOKEN')
-TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
+PRACTICUM_TOKEN = None
+TELEGRAM_TOKEN = None
+TELEGRAM_CHAT_ID = None
+ACCOUNTS_FILE = None
+ASYNC_POLLING = False
+TEMPLATES_FILE = None
+SUBSCRIPTIONS_FILE = None
+JOURNAL_DIR = None
+TELEGRAM_COMMANDS = False
+STATE_STORE = None
+METRICS_PORT = None
+WORKER_INDEX = None
+WORKER_LOCK_FILE = None
 
 RETRY_TIME = 600
+ACTIVE_RETRY_TIME = 60
+MAX_RETRY_TIME = 3600
+MESSAGE_LIMIT = 4096
+TELEGRAM_GLOBAL_RATE = 30
+TELEGRAM_CHAT_RATE = 1
+SHUTDOWN_TIMEOUT = 10
+HISTORY_SIZE = 20
+FAILURE_THRESHOLD = 5
+CACHE_TTL = 5
+REPLAY_BATCH = 50
+IMPORT_WORKERS = 32
+IMPORT_ATTEMPTS = 3
+RECOVERY_TIME = 60
 ENDPOINT = 'https://practicum.yandex.ru/api/user_api/homework_statuses/'
-HEADERS = {'Authorization': f'OAuth {PRACTICUM_TOKEN}'}
+HEADERS = auth_headers(PRACTICUM_TOKEN)
+TELEGRAM_API_URL = 'https://api.telegram.org'
+MAX_CONNECTIONS = 100
+POLL_WORKERS = 16
+REQUEST_TIMEOUT = 30
+WORKER_COUNT = 1
+LOG_LEVEL = 'DEBUG'
+LOG_FILE = 'main.log'
+LOG_MAX_BYTES = 10485760
+LOG_BACKUP_COUNT = 5
+LOG_ROTATE_WHEN = None
+LOG_FORMAT = None
+TRACE_FILE = None
+TRACE_OTLP_ENDPOINT = None
+TRACE_SAMPLE_RATE = 0.1
+SETTINGS = (
+    'PRACTICUM_TOKEN', 'TELEGRAM_TOKEN', 'TELEGRAM_CHAT_ID', 'ACCOUNTS_FILE',
+    'ASYNC_POLLING', 'TEMPLATES_FILE', 'SUBSCRIPTIONS_FILE', 'JOURNAL_DIR',
+    'TELEGRAM_COMMANDS', 'STATE_STORE', 'METRICS_PORT', 'WORKER_INDEX',
+    'WORKER_LOCK_FILE', 'ENDPOINT', 'TELEGRAM_API_URL', 'MAX_CONNECTIONS',
+    'REQUEST_TIMEOUT', 'WORKER_COUNT', 'LOG_LEVEL', 'LOG_FILE',
+    'LOG_MAX_BYTES', 'LOG_BACKUP_COUNT', 'LOG_ROTATE_WHEN', 'LOG_FORMAT',
+    'TRACE_FILE', 'TRACE_OTLP_ENDPOINT', 'TRACE_SAMPLE_RATE', 'POLL_WORKERS',
+)
+FALSE_VALUES = ('', '0', 'false', 'no', 'off')
+
+
+def parse_flag(value):
+    """Converts an on/off environment variable to a bool."""
+    return value.strip().lower() not in FALSE_VALUES
+
 
+SETTING_TYPES = {
+    'MAX_CONNECTIONS': int, 'REQUEST_TIMEOUT': int, 'WORKER_COUNT': int,
+    'LOG_MAX_BYTES': int, 'LOG_BACKUP_COUNT': int, 'TRACE_SAMPLE_RATE': float,
+    'ASYNC_POLLING': parse_flag, 'TELEGRAM_COMMANDS': parse_flag,
+    'POLL_WORKERS': int,
+}
+SETTING_VARIABLES = {'ENDPOINT': 'PRACTICUM_ENDPOINT'}
 
 HOMEWORK_STATUSES = {
     'approved': 'The work is checked: the reviewer liked everything.',
     'reviewing': 'The work was taken for verification by the reviewer.',
     'rejected': 'The work has been checked: the reviewer has comments.'
 }
+MESSAGE_TEMPLATE = (
+    'Job verification status changed "{homework_name}". {verdict}')
+RU_HOMEWORK_STATUSES = {
+    'approved': 'Работа проверена: ревьюеру всё понравилось. Ура!',
+    'reviewing': 'Работа взята на проверку ревьюером.',
+    'rejected': 'Работа проверена: у ревьюера есть замечания.'
+}
+RU_MESSAGE_TEMPLATE = (
+    'Изменился статус проверки работы "{homework_name}". {verdict}')
+DEFAULT_LOCALE = 'en'
 
-logging.basicConfig(
-    level=logging.DEBUG,
-    filename='main.log',
-    filemode='a',
-    format='%(asctime)s  [%(levelname)s]  %(message)s'
-)
 logger = logging.getLogger(__name__)
-streamHandler = logging.StreamHandler(sys.stdout)
-streamHandler.setLevel(logging.DEBUG)
-formatter = logging.Formatter('%(asctime)s  [%(levelname)s]  %(message)s')
-streamHandler.setFormatter(formatter)
-logger.addHandler(streamHandler)
+
+templates = TemplateRegistry(DEFAULT_LOCALE)
+templates.register(DEFAULT_LOCALE, MESSAGE_TEMPLATE, HOMEWORK_STATUSES)
+templates.register('ru', RU_MESSAGE_TEMPLATE, RU_HOMEWORK_STATUSES)
+templates.compile()
+
+
+def create_api_client():
+    """Creates the client of the Practicum API from the settings."""
+    return PracticumClient(
+        ENDPOINT, timeout=REQUEST_TIMEOUT,
+        breaker=CircuitBreaker(FAILURE_THRESHOLD, RECOVERY_TIME),
+        cache_ttl=CACHE_TTL)
+
+
+api_client = create_api_client()
+
+history = TransitionHistory(HISTORY_SIZE)
+
+subscriptions = Subscriptions()
+file_sink = FileSink()
+journal = None
+tracer = Tracer()
+# Polls running in parallel wait for the API outside of the lock
+# and take it to update the state.
+poll_lock = threading.Lock()
+
+ERRORS = Counter(
+    'homework_errors_total', 'Errors caught while polling', ['exception'])
+TELEGRAM_LATENCY = Histogram(
+    'homework_telegram_send_seconds', 'Duration of Telegram sends')
+TELEGRAM_FAILURES = Counter(
+    'homework_telegram_failures_total', 'Failed Telegram sends')
+LAST_SUCCESS = Gauge(
+    'homework_last_success_timestamp_seconds',
+    'Time of the last successful poll', ['account'])
+Counter(
+    'homework_api_polls_total', 'Polls by the way the answer was obtained',
+    ['result'], function=lambda: {
+        (result,): api_client.stats[result] for result in POLL_RESULTS})
+Counter(
+    'homework_api_bytes_saved_total',
+    'Answer bytes not downloaded thanks to 304 answers',
+    function=lambda: api_client.stats['bytes_saved'])
+Gauge(
+    'homework_api_circuit_state', 'State of the API circuit breaker',
+    ['state'], function=lambda: {
+        (state,): int(api_client.breaker.state == state)
+        for state in (CircuitBreaker.CLOSED, CircuitBreaker.OPEN,
+                      CircuitBreaker.HALF_OPEN)})
+
+
+def homework_attributes(homework, *args, **kwargs):
+    """Returns the span attributes of a homework."""
+    if not isinstance(homework, dict):
+        return {}
+    return {'homework': homework.get('homework_name')}
+
+
+def chat_attributes(client, chat_id, *args, **kwargs):
+    """Returns the span attributes of a message to a chat."""
+    return {'chat_id': chat_id}
 
 
 def send_message(bot, message):
     """Sends a message to the bot."""
+    send_to_chat(bot, TELEGRAM_CHAT_ID, message)
+
+
+@tracer.traced('send_message', chat_attributes)
+def send_to_chat(bot, chat_id, message):
+    """Sends a message to the given chat."""
     try:
-        bot.send_message(chat_id=TELEGRAM_CHAT_ID, text=message)
+        with TELEGRAM_LATENCY.time():
+            bot.send_message(chat_id=chat_id, text=message)
         logger.info(message)
     except telegram.error.TelegramError:
+        TELEGRAM_FAILURES.inc()
         logger.error('Problems sending messages to Telegram')
 
 
+@tracer.traced('get_api_answer')
 def get_api_answer(current_timestamp):
     """Makes a request to an API service."""
-    timestamp = current_timestamp or int(time.time())
-    params = {'from_date': timestamp}
-    try:
-        response = requests.get(url=ENDPOINT, headers=HEADERS, params=params)
-        if response.status_code != 200:
-            raise APIValueException(
-                f'API not available: error {response.status_code}')
-        return response.json()
-    except json.JSONDecodeError:
-        raise APIValueException(
-            'Problem with converting from JSON API response')
-    except requests.ConnectionError:
-        raise ConnectionError('Server is not available')
+    return api_client.get_homeworks(HEADERS, current_timestamp)
+
+
+@tracer.traced('get_api_answer')
+async def get_api_answer_async(session, current_timestamp, headers=None):
+    """Makes a request to an API service without blocking the loop."""
+    response, _ = await api_client.fetch_async(
+        session, headers or HEADERS, current_timestamp)
+    return response
 
 
+@tracer.traced('check_response')
 def check_response(response):
     """Checks the API response for correctness."""
     if not isinstance(response, dict):
@@ -81,18 +230,52 @@ def check_response(response):
 
 def parse_status(homework):
     """Processes received homework."""
+    return format_status(homework, DEFAULT_LOCALE)
+
+
+@tracer.traced('parse_status', homework_attributes)
+def format_status(homework, locale):
+    """Processes received homework for a chat with the given locale."""
     homework_name = homework.get('homework_name')
     homework_status = homework.get('status')
-    if homework_status in HOMEWORK_STATUSES:
-        verdict = HOMEWORK_STATUSES[homework_status]
-    elif homework_name is None:
-        raise KeyError('Missing homework_status key')
-    elif homework_status is None:
-        raise KeyError('Missing key homework_name')
-    else:
+    if homework_status not in HOMEWORK_STATUSES:
+        if homework_name is None:
+            raise KeyError('Missing homework_status key')
+        if homework_status is None:
+            raise KeyError('Missing key homework_name')
         raise KeyError('Unexpected Status')
-    logger.info('Homework status change received')
-    return f'Job verification status changed "{homework_name}". {verdict}'
+    logger.info('Homework status change received',
+                extra={'homework': homework_name})
+    return templates.render(locale, homework)
+
+
+def join_messages(messages, limit=MESSAGE_LIMIT):
+    """Joins messages into as few texts as Telegram accepts."""
+    texts = []
+    current = ''
+    for message in messages:
+        while len(message) > limit:
+            if current:
+                texts.append(current)
+                current = ''
+            texts.append(message[:limit])
+            message = message[limit:]
+        if not current:
+            current = message
+        elif len(current) + 1 + len(message) <= limit:
+            current = f'{current}\n{message}'
+        else:
+            texts.append(current)
+            current = message
+    if current:
+        texts.append(current)
+    return texts
+
+
+def build_messages(homeworks, locale=DEFAULT_LOCALE):
+    """Prepares the texts about all changed homeworks."""
+    return join_messages(
+        [format_status(homework, locale) for homework in homeworks])
 
 
 def check_tokens():
@@ -110,34 +293,714 @@ def check_tokens():
     return True
 
 
+def record_homeworks(store, account, response, transitions):
+    """Saves the result of a poll and returns the new statuses."""
+    apply_transitions(store, account.name, transitions)
+    history.add(account.name, transitions)
+    if journal is not None:
+        for transition in transitions:
+            journal.append(account.name, transition.homework,
+                           response.get('current_date'))
+    if response.get('homeworks'):
+        store.set_cursor(account.name, response.get('current_date'))
+    store.set_error(account.name, '')
+    LAST_SUCCESS.set(time.time(), account.name)
+    return [transition.status for transition in transitions]
+
+
+def report_error(store, account, error):
+    """Logs the error and returns the message if it is new."""
+    ERRORS.inc(type(error).__name__)
+    message = (f'Program crash: {error} '
+               f'(API circuit {api_client.breaker.state})')
+    logger.error(f'{account.name}: {message}',
+                 extra={'account': account.name})
+    if store.get_error(account.name) == message:
+        return None
+    store.set_error(account.name, message)
+    return message
+
+
+def check_account(outbox, account, store):
+    """Polls one account and returns the new statuses."""
+    with tracer.span('get_api_answer'):
+        response, changed = api_client.fetch(
+            auth_headers(account.token), store.get_cursor(account.name))
+    with poll_lock:
+        return process_answer(outbox, account, store, response, changed)
+
+
+async def check_account_async(session, outbox, account, store):
+    """Polls one account on the event loop and returns the new statuses."""
+    with tracer.span('get_api_answer'):
+        response, changed = await api_client.fetch_async(
+            session, auth_headers(account.token),
+            store.get_cursor(account.name))
+    return process_answer(outbox, account, store, response, changed)
+
+
+def process_answer(outbox, account, store, response, changed):
+    """Publishes the status changes in the answer and saves them."""
+    if not changed:
+        logger.debug(f'API answer has not changed: {account.name}',
+                     extra={'account': account.name})
+        return record_homeworks(store, account, response, [])
+    transitions = find_transitions(
+        store, account.name, check_response(response))
+    if not transitions:
+        logger.debug(f'Homework status has not changed: {account.name}',
+                     extra={'account': account.name})
+    for message in build_messages(
+            [transition.homework for transition in transitions],
+            account.locale):
+        outbox.publish(account, message)
+    return record_homeworks(store, account, response, transitions)
+
+
+def create_bot():
+    """Creates the bot talking to the Telegram Bot API at TELEGRAM_API_URL."""
+    return telegram.Bot(
+        token=TELEGRAM_TOKEN, base_url=f'{TELEGRAM_API_URL}/bot')
+
+
+def create_outbox(bot):
+    """Creates the queue delivering messages through the bot.
+
+    Status messages are also copied to the subscribed destinations.
+    """
+    def deliver(chat_id, message):
+        try:
+            with tracer.span('send_message', chat_id=chat_id), \
+                    TELEGRAM_LATENCY.time():
+                bot.send_message(chat_id=chat_id, text=message)
+        except Exception:
+            TELEGRAM_FAILURES.inc()
+            raise
+        logger.info(message)
+
+    outbox = Outbox(
+        deliver, TELEGRAM_GLOBAL_RATE, TELEGRAM_CHAT_RATE,
+        give_up_on=(telegram.error.BadRequest, telegram.error.Unauthorized))
+    fanout = FanOut(outbox, subscriptions, {
+        WEBHOOK: WebhookSink(create_session(MAX_CONNECTIONS), REQUEST_TIMEOUT),
+        FILE: file_sink,
+    })
+    Gauge('homework_outbox_messages', 'Messages waiting to be sent',
+          function=fanout.__len__)
+    return fanout
+
+
+def chat_accounts(accounts, chat_id):
+    """Returns the accounts reporting to the chat."""
+    return [
+        account for account in accounts
+        if str(account.chat_id) == str(chat_id)
+    ]
+
+
+def status_command(store, accounts, chat_id):
+    """Answers /status with the known statuses of the homeworks."""
+    lines = []
+    for account in chat_accounts(accounts, chat_id):
+        statuses = store.get_statuses(account.name)
+        lines.append(f'{account.name}:')
+        lines.extend(
+            f'{homework}: {status}'
+            for homework, status in sorted(statuses.items()))
+        if not statuses:
+            lines.append('No homework statuses received yet')
+    return '\n'.join(lines) or 'No accounts are linked to this chat'
+
+
+def history_command(accounts, chat_id):
+    """Answers /history with the latest status changes."""
+    lines = []
+    for account in chat_accounts(accounts, chat_id):
+        lines.append(f'{account.name}:')
+        changes = history.get(account.name)
+        lines.extend(
+            f'{time.strftime("%Y-%m-%d %H:%M", time.localtime(received))} '
+            f'{transition.homework.get("homework_name")}: '
+            f'{transition.old_status or "new"} -> {transition.status}'
+            for received, transition in changes)
+        if not changes:
+            lines.append('No status changes since the bot started')
+    return '\n'.join(lines) or 'No accounts are linked to this chat'
+
+
+def create_command_listener(bot, outbox, store, accounts):
+    """Creates the listener answering commands from the cached state."""
+    handlers = {
+        '/status': lambda chat_id: status_command(store, accounts, chat_id),
+        '/history': lambda chat_id: history_command(accounts, chat_id),
+    }
+    return CommandListener(bot, handlers, outbox.put)
+
+
+def create_policy():
+    """Creates the policy choosing delays between polls."""
+    return AdaptivePolicy(RETRY_TIME, ACTIVE_RETRY_TIME, MAX_RETRY_TIME)
+
+
+def start_cursors(store, accounts):
+    """Starts polling new accounts from the current time."""
+    current_timestamp = int(time.time())
+    for account in accounts:
+        if store.get_cursor(account.name) is None:
+            store.set_cursor(account.name, current_timestamp)
+
+
+@tracer.traced('poll', lambda outbox, account, store, policy: {
+    'account': account.name})
+def poll_account(outbox, account, store, policy):
+    """Polls one account and returns the delay before the next poll."""
+    try:
+        statuses = check_account(outbox, account, store)
+        with poll_lock:
+            return policy.on_success(
+                account.name, statuses,
+                store.get_statuses(account.name).values())
+    except Exception as error:
+        with poll_lock:
+            return poll_failed(outbox, account, store, policy, error)
+
+
+def poll_failed(outbox, account, store, policy, error):
+    """Reports the error of a poll and returns the delay before the next.
+
+    The remembered answer is dropped, so the next identical answer
+    is processed again.
+    """
+    api_client.forget(auth_headers(account.token))
+    message = report_error(store, account, error)
+    if message:
+        outbox.put(account.chat_id, message, ERROR_PRIORITY)
+    return policy.on_error(account.name, getattr(error, 'retry_after', None))
+
+
+def schedule_accounts(scheduler, store, policy, accounts):
+    """Spreads the first polls of the accounts over RETRY_TIME.
+
+    The policy learns which accounts have a homework under review
+    from the saved statuses.
+    """
+    start_cursors(store, accounts)
+    for number, account in enumerate(accounts):
+        policy.seed(account.name, store.get_statuses(account.name).values())
+        scheduler.schedule(account, RETRY_TIME * number / len(accounts))
+
+
+def reload_roster(reload):
+    """Reads the new roster, keeping the old one when it is broken."""
+    try:
+        return reload()
+    except Exception as error:
+        logger.error(f'Cannot reload the roster: {error}')
+        return None
+
+
+def apply_roster(scheduler, store, policy, accounts):
+    """Switches the scheduler to a new roster.
+
+    Known accounts keep their poll times, so a reload does not poll
+    the whole roster at once. New accounts are spread as on start.
+    """
+    fresh = {account.name: account for account in accounts}
+    known = set()
+
+    def replace(account):
+        known.add(account.name)
+        if account.name not in fresh:
+            policy.forget(account.name)
+        return fresh.get(account.name)
+
+    scheduler.update(replace)
+    added = [account for account in accounts if account.name not in known]
+    schedule_accounts(scheduler, store, policy, added)
+    logger.info(
+        f'Roster reloaded: {len(accounts)} accounts, {len(added)} new')
+
+
+def poll_due(outbox, accounts, store, policy, lifecycle):
+    """Polls the accounts in at most POLL_WORKERS threads at a time.
+
+    Yields the accounts and the delays before their next polls.
+    No new polls are started once the bot is stopping.
+    """
+    accounts = itertools.takewhile(
+        lambda account: not lifecycle.stopping.is_set(), accounts)
+    for account, delay, error in bounded_map(
+            lambda account: poll_account(outbox, account, store, policy),
+            accounts, POLL_WORKERS):
+        if error is not None:
+            logger.error(f'{account.name}: poll failed: {error}',
+                         extra={'account': account.name})
+            delay = policy.on_error(account.name)
+        yield account, delay
+
+
+def run_accounts(outbox, accounts, store, lifecycle, reload):
+    """Polls all accounts from one loop with a shared scheduler.
+
+    The accounts that are due are polled in parallel by poll_due.
+    The roster list is updated in place on reload, so the command
+    listener sees the same accounts.
+    """
+    scheduler = PollScheduler()
+    policy = create_policy()
+    schedule_accounts(scheduler, store, policy, accounts)
+    while lifecycle.wait(scheduler.time_until_next()):
+        fresh = reload_roster(reload) if lifecycle.take_reload() else None
+        if fresh is not None:
+            apply_roster(scheduler, store, policy, fresh)
+            accounts[:] = fresh
+        for account, delay in poll_due(
+                outbox, scheduler.pop_due(), store, policy, lifecycle):
+            scheduler.schedule(account, delay)
+        store.flush()
+
+
+async def sleep_or_stop(stop, delay):
+    """Sleeps for delay seconds and returns True if stop was set."""
+    try:
+        await asyncio.wait_for(stop.wait(), delay)
+    except asyncio.TimeoutError:
+        return False
+    return True
+
+
+@tracer.traced('poll', lambda session, outbox, account, store, policy: {
+    'account': account.name})
+async def poll_once_async(session, outbox, account, store, policy):
+    """Polls one account on the event loop and returns the next delay.
+
+    Messages are queued to outbox, so the poll does not wait for
+    Telegram and the rate limits and retries of the outbox apply.
+    """
+    try:
+        statuses = await check_account_async(session, outbox, account, store)
+        return policy.on_success(account.name, statuses,
+                                 store.get_statuses(account.name).values())
+    except Exception as error:
+        return poll_failed(outbox, account, store, policy, error)
+
+
+async def poll_account_async(session, outbox, account, delay, policy, store,
+                             stop):
+    """Polls one account on the event loop until stop is set."""
+    while not await sleep_or_stop(stop, delay):
+        delay = await poll_once_async(session, outbox, account, store, policy)
+        store.flush()
+
+
+class AccountTasks:
+    """Keeps one polling task per account on the event loop."""
+
+    def __init__(self, session, outbox, policy, store):
+        """Starts with no tasks."""
+        self.session = session
+        self.outbox = outbox
+        self.policy = policy
+        self.store = store
+        self.tasks = {}
+
+    def start(self, accounts):
+        """Starts the tasks spreading their first polls."""
+        start_cursors(self.store, accounts)
+        for number, account in enumerate(accounts):
+            self.policy.seed(
+                account.name, self.store.get_statuses(account.name).values())
+            stop = asyncio.Event()
+            task = asyncio.create_task(poll_account_async(
+                self.session, self.outbox, account,
+                RETRY_TIME * number / len(accounts), self.policy,
+                self.store, stop))
+            self.tasks[account.name] = (account, stop, task)
+
+    def replace(self, accounts):
+        """Restarts only the tasks of added, changed and removed accounts."""
+        fresh = {account.name: account for account in accounts}
+        for name, (account, stop, _) in list(self.tasks.items()):
+            if fresh.get(name) != account:
+                stop.set()
+                del self.tasks[name]
+                self.policy.forget(name)
+        self.start([
+            account for account in accounts if account.name not in self.tasks
+        ])
+        logger.info(f'Roster reloaded: {len(accounts)} accounts')
+
+    async def stop(self, timeout):
+        """Lets the tasks finish their current poll."""
+        for _, stop, _ in self.tasks.values():
+            stop.set()
+        tasks = [task for _, _, task in self.tasks.values()]
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=timeout)
+            for task in pending:
+                task.cancel()
+
+
+async def main_async(outbox, accounts, store, lifecycle, reload):
+    """Polls all accounts concurrently on one event loop.
+
+    The roster list is updated in place on reload, so the command
+    listener sees the same accounts.
+    """
+    if aiohttp is None:
+        raise ImportError('aiohttp is required for asynchronous polling')
+    connector = aiohttp.TCPConnector(limit=MAX_CONNECTIONS)
+    timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+    loop = asyncio.get_running_loop()
+    wakeup = asyncio.Event()
+    lifecycle.add_listener(lambda: loop.call_soon_threadsafe(wakeup.set))
+    async with aiohttp.ClientSession(
+            connector=connector, timeout=timeout) as session:
+        tasks = AccountTasks(session, outbox, create_policy(), store)
+        tasks.start(accounts)
+        while not lifecycle.stopping.is_set():
+            await wakeup.wait()
+            wakeup.clear()
+            fresh = reload_roster(reload) if lifecycle.take_reload() else None
+            if fresh is not None:
+                tasks.replace(fresh)
+                accounts[:] = fresh
+        await tasks.stop(SHUTDOWN_TIMEOUT)
+
+
+def run_polling(accounts, store, lifecycle, reload):
+    """Polls the accounts sending messages through the outbox.
+
+    With ASYNC_POLLING the accounts are polled on an event loop,
+    otherwise from one thread with a shared scheduler.
+    """
+    outbox = create_outbox(create_bot())
+    outbox.start()
+    listener = None
+    if TELEGRAM_COMMANDS:
+        # The long polling getUpdates gets its own bot, so it does not
+        # hold the single pooled connection of the sending bot.
+        listener = create_command_listener(
+            create_bot(), outbox, store, accounts)
+        listener.start()
+    try:
+        if ASYNC_POLLING:
+            asyncio.run(
+                main_async(outbox, accounts, store, lifecycle, reload))
+        else:
+            api_client.session = create_session(MAX_CONNECTIONS)
+            run_accounts(outbox, accounts, store, lifecycle, reload)
+    finally:
+        if listener is not None:
+            # The daemon thread of the listener may wait in getUpdates
+            # for its whole timeout, so it is not waited for.
+            listener.stop(0)
+        outbox.stop(SHUTDOWN_TIMEOUT)
+
+
+def claim_shard():
+    """Returns the index of this worker and the held lock file.
+
+    The index is None when the roster is not sharded. The lock file
+    is returned when the index was claimed through WORKER_LOCK_FILE.
+    """
+    if WORKER_COUNT <= 1:
+        return None, None
+    if WORKER_INDEX is not None:
+        return int(WORKER_INDEX), None
+    if WORKER_LOCK_FILE:
+        return claim_worker_index(WORKER_LOCK_FILE, WORKER_COUNT)
+    raise RuntimeError('Set WORKER_INDEX or WORKER_LOCK_FILE to shard')
+
+
+def own_accounts(accounts, worker_index):
+    """Keeps only the accounts owned by this worker."""
+    if worker_index is None:
+        return accounts
+    owned = shard_accounts(accounts, worker_index, WORKER_COUNT)
+    logger.info(
+        f'Worker {worker_index} of {WORKER_COUNT} owns '
+        f'{len(owned)} of {len(accounts)} accounts')
+    return owned
+
+
+def load_roster():
+    """Reads the polled accounts from ACCOUNTS_FILE or the variables."""
+    if not ACCOUNTS_FILE:
+        return [Account('default', PRACTICUM_TOKEN, TELEGRAM_CHAT_ID)]
+    accounts = load_accounts(ACCOUNTS_FILE)
+    logger.info(f'Loaded {len(accounts)} accounts from {ACCOUNTS_FILE}')
+    return accounts
+
+
+def reload_config(worker_index):
+    """Re-reads the templates, subscriptions and roster of this worker."""
+    if TEMPLATES_FILE:
+        templates.load(TEMPLATES_FILE).compile()
+    if SUBSCRIPTIONS_FILE:
+        subscriptions.load(SUBSCRIPTIONS_FILE)
+    return own_accounts(load_roster(), worker_index)
+
+
+def read_settings(environ):
+    """Returns the settings given by the environment variables."""
+    settings = {}
+    for name in SETTINGS:
+        value = environ.get(SETTING_VARIABLES.get(name, name))
+        if value is not None:
+            settings[name] = SETTING_TYPES.get(name, str)(value)
+    return settings
+
+
+def create_app(config=None):
+    """Prepares the bot for a run instead of doing it on import.
+
+    Reads the settings from .env and the environment; config maps
+    names from SETTINGS to values that replace them. Sets up
+    logging, creates the API client, loads the templates,
+    subscriptions and journal and chooses where the trace spans
+    are exported. Returns the listener writing the log records.
+    """
+    global api_client, journal, HEADERS
+    unknown = set(config or {}) - set(SETTINGS)
+    if unknown:
+        raise KeyError(f'Unknown settings: {", ".join(sorted(unknown))}')
+    load_dotenv()
+    globals().update(read_settings(os.environ))
+    globals().update(config or {})
+    listener = setup_logging(
+        level=LOG_LEVEL, filename=LOG_FILE, max_bytes=LOG_MAX_BYTES,
+        backup_count=LOG_BACKUP_COUNT, when=LOG_ROTATE_WHEN,
+        json_format=LOG_FORMAT == 'json')
+    HEADERS = auth_headers(PRACTICUM_TOKEN)
+    api_client = create_api_client()
+    if TEMPLATES_FILE:
+        templates.load(TEMPLATES_FILE).compile()
+    if SUBSCRIPTIONS_FILE:
+        subscriptions.load(SUBSCRIPTIONS_FILE)
+    journal = Journal(JOURNAL_DIR) if JOURNAL_DIR else None
+    if TRACE_OTLP_ENDPOINT:
+        tracer.configure(OTLPExporter(TRACE_OTLP_ENDPOINT), TRACE_SAMPLE_RATE)
+    elif TRACE_FILE:
+        tracer.configure(JsonFileExporter(TRACE_FILE), TRACE_SAMPLE_RATE)
+    if tracer.exporter is not None:
+        atexit.register(tracer.close)
+    return listener
+
+
 def main():
     """The main logic of the bot."""
-    if not check_tokens():
+    if ACCOUNTS_FILE and not TELEGRAM_TOKEN:
+        logger.critical('Missing variable TELEGRAM_TOKEN')
         return
-    bot = telegram.Bot(token=TELEGRAM_TOKEN)
-    current_timestamp = int(time.time())
-    old_message = ''
+    if not ACCOUNTS_FILE and not check_tokens():
+        return
+    try:
+        worker_index, worker_lock = claim_shard()
+        accounts = own_accounts(load_roster(), worker_index)
+    except (RuntimeError, ValueError) as error:
+        logger.critical(f'Cannot claim a worker shard: {error}')
+        return
+    if METRICS_PORT:
+        start_metrics_server(int(METRICS_PORT))
+    lifecycle = Lifecycle().install()
+    reload = functools.partial(reload_config, worker_index)
+    store = open_state_store(STATE_STORE)
+    try:
+        run_polling(accounts, store, lifecycle, reload)
+    finally:
+        store.close()
+        if journal is not None:
+            journal.close()
+        if worker_lock:
+            worker_lock.close()
+        logger.info('Bot stopped')
+
 
-    while True:
+def parse_time(value):
+    """Parses a Unix timestamp or an ISO 8601 date."""
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def replay_messages(events, accounts, chat_id=None):
+    """Renders journaled events into pairs of a chat and a text.
+
+    Messages for one chat are collected in batches of REPLAY_BATCH
+    and joined into as few texts as Telegram accepts. With chat_id
+    all events go to that chat, prefixed with the account name.
+    Events of unknown accounts and invalid events are skipped.
+    """
+    roster = {account.name: account for account in accounts}
+    batches = {}
+    for event in events:
+        account = roster.get(event.account)
+        if account is None and chat_id is None:
+            logger.warning(f'Skipping unknown account {event.account}')
+            continue
         try:
-            response = get_api_answer(current_timestamp)
-            homework_date = check_response(response)
-            if len(homework_date) == 0:
-                logger.debug('Homework status has not changed')
-            else:
-                message = parse_status(homework_date[0])
-                send_message(bot, message)
-                current_timestamp = response.get('current_date')
-            old_message = ''
-        except Exception as error:
-            message = f'Program crash: {error}'
-            logger.error(message)
-            if old_message != message:
-                send_message(bot, message)
-                old_message = message
-        finally:
-            time.sleep(RETRY_TIME)
+            message = format_status(
+                event.homework, account and account.locale)
+        except (KeyError, AttributeError) as error:
+            logger.warning(
+                f'Skipping invalid event of {event.account}: {error}')
+            continue
+        if chat_id is None:
+            target = account.chat_id
+        else:
+            target, message = chat_id, f'{event.account}: {message}'
+        batch = batches.setdefault(target, [])
+        batch.append(message)
+        if len(batch) >= REPLAY_BATCH:
+            for text in join_messages(batches.pop(target)):
+                yield target, text
+    for target, batch in batches.items():
+        for text in join_messages(batch):
+            yield target, text
+
+
+def replay_journal(argv=None):
+    """Sends the journaled status changes of a time range in bulk.
+
+    The Practicum API is not called. With --restore-state the events
+    rebuild the homework statuses in STATE_STORE instead.
+    """
+    parser = argparse.ArgumentParser(
+        prog='homework.py replay',
+        description='Replay the status changes saved in JOURNAL_DIR')
+    parser.add_argument('--since', type=parse_time,
+                        help='Unix time or ISO date of the first event')
+    parser.add_argument('--until', type=parse_time,
+                        help='Unix time or ISO date of the last event')
+    parser.add_argument('--account', action='append', dest='accounts',
+                        help='replay only this account, can be repeated')
+    parser.add_argument('--chat-id', help='send all messages to this chat')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='print the messages instead of sending them')
+    parser.add_argument('--restore-state', action='store_true',
+                        help='rebuild the statuses in STATE_STORE')
+    args = parser.parse_args(argv)
+    if journal is None:
+        logger.critical('Missing variable JOURNAL_DIR')
+        return
+    events = journal.read(args.accounts, args.since, args.until)
+    if args.restore_state:
+        store = open_state_store(STATE_STORE)
+        found = replay(store, (
+            (event.account, event.homework) for event in events))
+        store.close()
+        logger.info(f'Restored {len(found)} status changes')
+        return
+    messages = replay_messages(events, load_roster(), args.chat_id)
+    if args.dry_run:
+        for chat_id, text in messages:
+            print(f'{chat_id}: {text}')
+        return
+    outbox = create_outbox(create_bot())
+    outbox.start()
+    try:
+        for chat_id, text in messages:
+            outbox.put(chat_id, text)
+    finally:
+        outbox.stop()
+
+
+def fetch_history(account):
+    """Requests the whole homework history of the account.
+
+    Rate limited requests are repeated after the time the API asks.
+    """
+    headers = auth_headers(account.token)
+    for attempt in range(1, IMPORT_ATTEMPTS + 1):
+        try:
+            return api_client.get_homeworks(headers, 0)
+        except APIRateLimitException as error:
+            if attempt == IMPORT_ATTEMPTS:
+                raise
+            time.sleep(error.retry_after or ACTIVE_RETRY_TIME)
+
+
+def fetch_histories(accounts, workers):
+    """Yields the accounts and their histories as they arrive."""
+    for account, response, error in bounded_map(
+            fetch_history, accounts, workers):
+        if error is not None:
+            logger.error(f'Cannot import {account.name}: {error}',
+                         extra={'account': account.name})
+            continue
+        yield account, response
+
+
+def save_histories(store, histories):
+    """Stores imported histories without sending notifications.
+
+    Every change is checked with format_status, as a poll does, and
+    a history with an invalid homework is not imported. Yields the
+    accounts and the number of their status changes.
+    """
+    for account, response in histories:
+        try:
+            homeworks = sorted(
+                check_response(response),
+                key=lambda homework: homework.get('date_updated') or '')
+            transitions = find_transitions(store, account.name, homeworks)
+            for transition in transitions:
+                format_status(transition.homework, account.locale)
+        except (KeyError, TypeError, AttributeError) as error:
+            logger.error(f'Cannot import {account.name}: {error}',
+                         extra={'account': account.name})
+            continue
+        record_homeworks(store, account, response, transitions)
+        store.flush()
+        yield account, len(transitions)
+
+
+def import_history(argv=None):
+    """Imports the homework history of the accounts from from_date=0.
+
+    The histories are fetched in parallel and written to the state
+    store and the journal as they arrive; no messages are sent.
+    """
+    parser = argparse.ArgumentParser(
+        prog='homework.py import',
+        description='Import the homework history of the accounts')
+    parser.add_argument('--account', action='append', dest='accounts',
+                        help='import only this account, can be repeated')
+    parser.add_argument('--workers', type=int, default=IMPORT_WORKERS,
+                        help='number of parallel requests')
+    args = parser.parse_args(argv)
+    accounts = load_roster()
+    if args.accounts:
+        accounts = [
+            account for account in accounts if account.name in args.accounts
+        ]
+    api_client.session = create_session(args.workers)
+    store = open_state_store(STATE_STORE)
+    imported = changes = 0
+    try:
+        for _, count in save_histories(
+                store, fetch_histories(accounts, args.workers)):
+            imported += 1
+            changes += count
+    finally:
+        store.close()
+        if journal is not None:
+            journal.close()
+    logger.info(f'Imported {changes} status changes '
+                f'of {imported} of {len(accounts)} accounts')
+
+
+COMMANDS = {
+    'replay': replay_journal,
+    'import': import_history,
+}
 
 
 if __name__ == '__main__':
-    main()
+    create_app()
+    if sys.argv[1:2] and sys.argv[1] in COMMANDS:
+        COMMANDS[sys.argv[1]](sys.argv[2:])
+    else:
+        main()
@@ -0,0 +1,27 @@
+"""Module for running many blocking calls with bounded concurrency."""
+import itertools
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+def bounded_map(function, items, workers):
+    """Applies function to items in at most workers threads at a time.
+
+    Items are taken lazily, so the input can be a generator of any
+    length. Yields (item, result, error) in order of completion;
+    error is None when the call succeeded.
+    """
+    items = iter(items)
+    with ThreadPoolExecutor(workers) as executor:
+        pending = {
+            executor.submit(function, item): item
+            for item in itertools.islice(items, workers)
+        }
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = pending.pop(future)
+                for following in itertools.islice(items, 1):
+                    pending[executor.submit(function, following)] = following
+                error = future.exception()
+                result = None if error is not None else future.result()
+                yield item, result, error
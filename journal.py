@@ -0,0 +1,215 @@
+"""Module for the append-only journal of homework status events."""
+import bisect
+import glob
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+
+SEGMENT_SIZE = 4 * 1024 * 1024
+INDEX_EVERY = 64
+INDEX_FILE = 'index.json'
+
+Event = namedtuple(
+    'Event', ['received_at', 'account', 'status', 'current_date', 'homework'])
+
+
+def encode_event(event):
+    """Returns the compact journal line of an event."""
+    line = json.dumps(list(event), ensure_ascii=False, separators=(',', ':'))
+    return f'{line}\n'.encode()
+
+
+class Segment:
+    """Describes one file of the journal.
+
+    Keeps the time range and the accounts of the segment and the
+    offset of every index_every-th event, so a read can skip
+    the segments and the parts of a segment it does not need.
+    """
+
+    def __init__(self, path, first=None, last=None, accounts=(),
+                 offsets=(), size=0, events=0):
+        """Describes a segment, empty or loaded from the index."""
+        self.path = path
+        self.first = first
+        self.last = last
+        self.accounts = set(accounts)
+        self.offsets = [tuple(offset) for offset in offsets]
+        self.size = size
+        self.events = events
+
+    def add(self, event, length, index_every):
+        """Accounts for an event written at the end of the segment."""
+        if self.events % index_every == 0:
+            self.offsets.append((event.received_at, self.size))
+        if self.first is None:
+            self.first = event.received_at
+        self.last = event.received_at
+        self.accounts.add(event.account)
+        self.size += length
+        self.events += 1
+
+    def matches(self, accounts, since, until):
+        """Checks whether the segment can contain the requested events."""
+        if not self.events:
+            return False
+        if since is not None and self.last < since:
+            return False
+        if until is not None and self.first > until:
+            return False
+        return accounts is None or not self.accounts.isdisjoint(accounts)
+
+    def read(self, accounts, since, until):
+        """Yields the requested events of the segment in time order."""
+        start = 0
+        if since is not None:
+            times = [received_at for received_at, _ in self.offsets]
+            position = bisect.bisect_left(times, since) - 1
+            if position >= 0:
+                start = self.offsets[position][1]
+        with open(self.path, 'rb') as file:
+            file.seek(start)
+            for line in file:
+                if not line.endswith(b'\n'):
+                    break
+                event = Event(*json.loads(line))
+                if until is not None and event.received_at > until:
+                    break
+                if since is not None and event.received_at < since:
+                    continue
+                if accounts is None or event.account in accounts:
+                    yield event
+
+    def to_dict(self):
+        """Returns the description of the segment for the index file."""
+        return {
+            'path': os.path.basename(self.path), 'first': self.first,
+            'last': self.last, 'accounts': sorted(self.accounts),
+            'offsets': self.offsets, 'size': self.size,
+            'events': self.events,
+        }
+
+
+class Journal:
+    """Appends status events to segment files in a directory.
+
+    A segment is closed when it grows over segment_size bytes. The
+    index of the segments is kept in index.json and is checked
+    against the size of every file on open, so a segment written
+    after the last save is scanned again.
+    """
+
+    def __init__(self, directory, segment_size=SEGMENT_SIZE,
+                 index_every=INDEX_EVERY, clock=time.time):
+        """Opens the directory lazily on first use."""
+        self.directory = directory
+        self.segment_size = segment_size
+        self.index_every = index_every
+        self._clock = clock
+        self._segments = None
+        self._file = None
+        self._lock = threading.Lock()
+
+    def append(self, account, homework, current_date=None):
+        """Writes the event of a homework status change."""
+        event = Event(
+            self._clock(), account, homework.get('status'), current_date,
+            homework)
+        line = encode_event(event)
+        with self._lock:
+            segment = self._writable(len(line))
+            self._file.write(line)
+            self._file.flush()
+            segment.add(event, len(line), self.index_every)
+        return event
+
+    def read(self, accounts=None, since=None, until=None):
+        """Yields the events of the accounts received in [since, until]."""
+        if accounts is not None:
+            accounts = set(accounts)
+        with self._lock:
+            self._open()
+            segments = [
+                segment for segment in self._segments
+                if segment.matches(accounts, since, until)
+            ]
+        for segment in segments:
+            yield from segment.read(accounts, since, until)
+
+    def close(self):
+        """Writes the file to disk and saves the index."""
+        with self._lock:
+            if self._file is not None:
+                os.fsync(self._file.fileno())
+                self._file.close()
+                self._file = None
+            if self._segments is not None:
+                self._save_index()
+
+    def _open(self):
+        if self._segments is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        indexed = self._load_index()
+        segments = []
+        for path in sorted(glob.glob(
+                os.path.join(self.directory, 'segment-*.jsonl'))):
+            segment = indexed.get(os.path.basename(path))
+            if segment is None or segment.size != os.path.getsize(path):
+                segment = self._scan(path)
+            segments.append(segment)
+        self._segments = segments
+
+    def _load_index(self):
+        path = os.path.join(self.directory, INDEX_FILE)
+        if not os.path.exists(path):
+            return {}
+        with open(path, encoding='utf-8') as file:
+            entries = json.load(file)
+        return {
+            entry['path']: Segment(**{
+                **entry, 'path': os.path.join(self.directory, entry['path'])})
+            for entry in entries
+        }
+
+    def _save_index(self):
+        path = os.path.join(self.directory, INDEX_FILE)
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as file:
+            json.dump([segment.to_dict() for segment in self._segments], file)
+        os.replace(temporary, path)
+
+    def _scan(self, path):
+        """Rebuilds the index of a segment, cutting a torn last line."""
+        segment = Segment(path)
+        with open(path, 'rb') as file:
+            for line in file:
+                if not line.endswith(b'\n'):
+                    break
+                segment.add(Event(*json.loads(line)), len(line),
+                            self.index_every)
+        if os.path.getsize(path) != segment.size:
+            os.truncate(path, segment.size)
+        return segment
+
+    def _writable(self, length):
+        self._open()
+        segment = self._segments[-1] if self._segments else None
+        if segment is not None and (
+                segment.size + length <= self.segment_size
+                or not segment.events):
+            if self._file is None:
+                self._file = open(segment.path, 'ab')
+            return segment
+        if self._file is not None:
+            os.fsync(self._file.fileno())
+            self._file.close()
+        number = len(self._segments) + 1
+        segment = Segment(os.path.join(
+            self.directory, f'segment-{number:08d}.jsonl'))
+        self._segments.append(segment)
+        self._save_index()
+        self._file = open(segment.path, 'ab')
+        return segment
@@ -0,0 +1,22 @@
+"""Module for importing heavy dependencies on first use."""
+import importlib.util
+import sys
+
+
+def lazy_import(name):
+    """Returns the module that is loaded on first attribute access.
+
+    Returns None when the module is not installed, as the optional
+    imports of the project do.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        return None
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
@@ -0,0 +1,79 @@
+"""Module for stopping and reloading the bot on process signals."""
+import logging
+import signal
+import threading
+
+logger = logging.getLogger(__name__)
+
+STOP_SIGNALS = ('SIGTERM', 'SIGINT')
+RELOAD_SIGNALS = ('SIGHUP',)
+
+
+class Lifecycle:
+    """Turns process signals into stop and reload requests.
+
+    The polling loop sleeps in wait() instead of time.sleep(), so
+    a request wakes it at once. A second stop signal interrupts
+    the process without waiting for the shutdown to finish.
+    """
+
+    def __init__(self):
+        """Starts running with no signal handlers installed."""
+        self.stopping = threading.Event()
+        self._reload = threading.Event()
+        self._wakeup = threading.Event()
+        self._listeners = []
+
+    def install(self):
+        """Sets the signal handlers of the process."""
+        for name in STOP_SIGNALS:
+            signal.signal(getattr(signal, name), self._on_stop)
+        for name in RELOAD_SIGNALS:
+            if hasattr(signal, name):
+                signal.signal(getattr(signal, name), self._on_reload)
+        return self
+
+    def add_listener(self, callback):
+        """Calls callback without arguments on every request."""
+        self._listeners.append(callback)
+
+    def stop(self):
+        """Asks the polling loop to finish."""
+        self.stopping.set()
+        self._notify()
+
+    def reload(self):
+        """Asks the polling loop to reload the roster and config."""
+        self._reload.set()
+        self._notify()
+
+    def take_reload(self):
+        """Returns True once for every reload request."""
+        if not self._reload.is_set():
+            return False
+        self._reload.clear()
+        return True
+
+    def wait(self, timeout=None):
+        """Sleeps until timeout or a request.
+
+        Returns False when the loop has to stop.
+        """
+        self._wakeup.wait(timeout)
+        self._wakeup.clear()
+        return not self.stopping.is_set()
+
+    def _notify(self):
+        self._wakeup.set()
+        for callback in self._listeners:
+            callback()
+
+    def _on_stop(self, signum, frame):
+        if self.stopping.is_set():
+            raise KeyboardInterrupt
+        logger.info(f'Got signal {signum}, shutting down')
+        self.stop()
+
+    def _on_reload(self, signum, frame):
+        logger.info(f'Got signal {signum}, reloading')
+        self.reload()
@@ -0,0 +1,73 @@
+"""Module for setting up non-blocking logging."""
+import atexit
+import json
+import logging
+import queue
+import sys
+from logging.handlers import (QueueHandler, QueueListener,
+                              RotatingFileHandler, TimedRotatingFileHandler)
+
+LOG_FORMAT = '%(asctime)s  [%(levelname)s]  %(message)s'
+EXTRA_FIELDS = ('account', 'homework')
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as JSON lines."""
+
+    def format(self, record):
+        """Returns the record as one line of JSON."""
+        data = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for field in EXTRA_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                data[field] = value
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+def create_file_handler(filename, max_bytes, backup_count, when=None):
+    """Creates a handler rotating the file by time or by size."""
+    if when:
+        return TimedRotatingFileHandler(
+            filename, when=when, backupCount=backup_count, encoding='utf-8')
+    return RotatingFileHandler(
+        filename, maxBytes=max_bytes, backupCount=backup_count,
+        encoding='utf-8')
+
+
+def setup_logging(level='DEBUG', filename='main.log', max_bytes=10485760,
+                  backup_count=5, when=None, json_format=False):
+    """Sends the records of all loggers through a queue.
+
+    The calling thread only puts records into the queue, a listener
+    thread writes them to the rotated file and to stdout.
+    Returns the started listener.
+    """
+    formatter = JsonFormatter() if json_format else logging.Formatter(
+        LOG_FORMAT)
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if filename:
+        handlers.append(
+            create_file_handler(filename, max_bytes, backup_count, when))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    records = queue.SimpleQueue()
+    listener = QueueListener(records, *handlers, respect_handler_level=True)
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(QueueHandler(records))
+    listener.start()
+    atexit.register(stop_listener, listener)
+    return listener
+
+
+def stop_listener(listener):
+    """Writes the queued records and stops the listener once."""
+    if listener._thread is not None:
+        listener.stop()
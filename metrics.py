@@ -0,0 +1,194 @@
+"""Module for metrics in the Prometheus text format."""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Registry:
+    """Collection of metrics rendered together."""
+
+    def __init__(self):
+        """Creates an empty registry."""
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """Adds the metric, replacing one with the same name."""
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name):
+        """Returns the metric with the given name."""
+        return self._metrics.get(name)
+
+    def render(self):
+        """Returns all metrics in the Prometheus text format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{format_labels(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def format_labels(labels):
+    """Formats label pairs as {name="value",...}."""
+    if not labels:
+        return ''
+    pairs = ','.join(
+        f'{name}="{escape(value)}"' for name, value in labels)
+    return f'{{{pairs}}}'
+
+
+def escape(value):
+    """Escapes a label value."""
+    return (str(value).replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+class Metric:
+    """Metric with values for every combination of labels.
+
+    With function the values are not stored but taken from it
+    on render: a number, or a dict from label values to numbers.
+    """
+
+    kind = 'untyped'
+
+    def __init__(self, name, help, labelnames=(), function=None,
+                 registry=REGISTRY):
+        """Registers the metric in registry."""
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.function = function
+        self._values = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def value(self, *labels):
+        """Returns the current value for the labels."""
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        """Returns (name, labels, value) of every sample."""
+        if self.function is None:
+            with self._lock:
+                values = dict(self._values)
+        else:
+            values = self.function()
+            if not isinstance(values, dict):
+                values = {(): values}
+        return [
+            (self.name, tuple(zip(self.labelnames, labels)), value)
+            for labels, value in values.items()
+        ]
+
+
+class Counter(Metric):
+    """Value that only grows."""
+
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        """Increases the value for the labels."""
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    """Value that can go up and down."""
+
+    kind = 'gauge'
+
+    def set(self, value, *labels):
+        """Sets the value for the labels."""
+        self._values[labels] = value
+
+
+class Histogram(Metric):
+    """Distribution of observed values over buckets."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, buckets=DEFAULT_BUCKETS, **kwargs):
+        """Counts the observations in buckets."""
+        super().__init__(name, help, **kwargs)
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0
+        self._count = 0
+
+    @property
+    def count(self):
+        """Number of observed values."""
+        return self._count
+
+    def observe(self, value):
+        """Adds one value."""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    @contextmanager
+    def time(self):
+        """Observes the duration of the block in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def samples(self):
+        """Returns the cumulative bucket counts, sum and count."""
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+        samples = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+            cumulative += bucket_count
+            samples.append(
+                (f'{self.name}_bucket', (('le', bound),), cumulative))
+        samples.append((f'{self.name}_sum', (), total))
+        samples.append((f'{self.name}_count', (), count))
+        return samples
+
+
+def start_metrics_server(port, registry=REGISTRY, host=''):
+    """Serves the metrics at /metrics from a background thread."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header(
+                'Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(
+        target=server.serve_forever, name='metrics', daemon=True).start()
+    return server
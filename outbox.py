@@ -0,0 +1,186 @@
+"""Module for the queue of outgoing Telegram messages."""
+import contextvars
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import namedtuple
+
+STATUS_PRIORITY = 0
+ERROR_PRIORITY = 1
+
+Message = namedtuple('Message', ['chat_id', 'text', 'attempts', 'context'])
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Allows rate events per second with bursts up to capacity."""
+
+    def __init__(self, rate, capacity=1, clock=time.monotonic):
+        """Starts with a full bucket."""
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._tokens = capacity
+        self._updated = clock()
+
+    def wait_time(self):
+        """Returns the number of seconds until the next event is allowed."""
+        now = self._clock()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens >= 1:
+            return 0
+        return (1 - self._tokens) / self.rate
+
+    def consume(self):
+        """Takes one token."""
+        self._tokens -= 1
+
+
+class Outbox:
+    """Delivers messages from a background thread.
+
+    deliver(chat_id, text) sends one message and raises on failure.
+    Messages are sent in order of priority within the global and
+    per-chat rate limits. Failed messages are retried with
+    exponential backoff, or after retry_after if the error has it;
+    errors listed in give_up_on are not retried. name is used
+    in the logs and in the name of the thread. deliver runs in
+    a copy of the context variables of the code that put
+    the message, so tracing can tie a send to its poll.
+    """
+
+    def __init__(self, deliver, global_rate=30, chat_rate=1,
+                 max_attempts=5, retry_base=1, give_up_on=(),
+                 clock=time.monotonic, name='Telegram'):
+        """Prepares the queue; start runs the thread."""
+        self.deliver = deliver
+        self.name = name
+        self.chat_rate = chat_rate
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.give_up_on = give_up_on
+        self._clock = clock
+        self._global_bucket = TokenBucket(global_rate, global_rate, clock)
+        self._chat_buckets = {}
+        self._ready = []
+        self._delayed = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopping = False
+
+    def __len__(self):
+        """Returns the number of messages waiting to be sent."""
+        with self._condition:
+            return len(self._ready) + len(self._delayed)
+
+    def put(self, chat_id, text, priority=STATUS_PRIORITY):
+        """Adds a message to the queue."""
+        with self._condition:
+            heapq.heappush(self._ready, (
+                priority, next(self._counter),
+                Message(chat_id, text, 0, contextvars.copy_context())))
+            self._condition.notify()
+
+    def start(self):
+        """Starts the sending thread."""
+        self._thread = threading.Thread(
+            target=self._run, name=f'outbox-{self.name}', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """Sends the queued messages and stops the thread.
+
+        Returns the number of messages left unsent after timeout.
+        """
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        left = len(self)
+        if left:
+            logger.error(f'{left} messages were not sent to {self.name}')
+        return left
+
+    def send_next(self):
+        """Sends one message if possible.
+
+        Returns the number of seconds to wait before the next attempt
+        or None if the queue is empty.
+        """
+        with self._condition:
+            entry, wait = self._take()
+        if entry is None:
+            return wait
+        priority, _, message = entry
+        try:
+            message.context.run(self.deliver, message.chat_id, message.text)
+        except Exception as error:
+            self._retry(priority, message, error)
+        return 0
+
+    def _take(self):
+        now = self._clock()
+        while self._delayed and self._delayed[0][0] <= now:
+            _, entry = heapq.heappop(self._delayed)
+            heapq.heappush(self._ready, entry)
+        while self._ready:
+            entry = self._ready[0]
+            chat_wait = self._chat_bucket(entry[2].chat_id).wait_time()
+            if chat_wait:
+                heapq.heappop(self._ready)
+                heapq.heappush(self._delayed, (now + chat_wait, entry))
+                continue
+            global_wait = self._global_bucket.wait_time()
+            if global_wait:
+                return None, global_wait
+            heapq.heappop(self._ready)
+            self._global_bucket.consume()
+            self._chat_bucket(entry[2].chat_id).consume()
+            return entry, 0
+        if self._delayed:
+            return None, self._delayed[0][0] - now
+        return None, None
+
+    def _retry(self, priority, message, error):
+        attempts = message.attempts + 1
+        if isinstance(error, self.give_up_on) or (
+                attempts >= self.max_attempts):
+            logger.error(
+                f'Problems sending messages to {self.name}: {error}')
+            return
+        delay = getattr(error, 'retry_after', None)
+        if delay is None:
+            delay = self.retry_base * 2 ** (attempts - 1)
+        logger.warning(
+            f'Retrying message to {message.chat_id} in {delay} s: {error}')
+        with self._condition:
+            heapq.heappush(self._delayed, (
+                self._clock() + delay,
+                (priority, next(self._counter),
+                 message._replace(attempts=attempts))))
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(self.chat_rate, 1, self._clock)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _run(self):
+        while True:
+            wait = self.send_next()
+            if wait == 0:
+                continue
+            with self._condition:
+                if wait is None and self._ready:
+                    continue
+                if wait is None and self._stopping:
+                    return
+                self._condition.wait(wait)
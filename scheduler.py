@@ -0,0 +1,130 @@
+"""Module for scheduling polls of many accounts."""
+import heapq
+import itertools
+import random
+import time
+
+
+class PollScheduler:
+    """Keeps the time of the next poll for every account.
+
+    All accounts share one heap, so a single loop can serve
+    the whole roster.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        """Starts with no polls planned."""
+        self._clock = clock
+        self._heap = []
+        self._counter = itertools.count()
+
+    def __len__(self):
+        """Returns the number of planned polls."""
+        return len(self._heap)
+
+    def schedule(self, account, delay=0):
+        """Plans a poll of the account after delay seconds."""
+        heapq.heappush(
+            self._heap, (self._clock() + delay, next(self._counter), account))
+
+    def update(self, replace):
+        """Replaces the scheduled accounts keeping their poll times.
+
+        replace is called with every scheduled account and returns
+        the account to keep in its place or None to drop it.
+        """
+        heap = []
+        for when, number, account in self._heap:
+            account = replace(account)
+            if account is not None:
+                heap.append((when, number, account))
+        heapq.heapify(heap)
+        self._heap = heap
+
+    def time_until_next(self):
+        """Returns the number of seconds until the nearest poll."""
+        if not self._heap:
+            return None
+        return max(0, self._heap[0][0] - self._clock())
+
+    def pop_due(self):
+        """Returns the accounts whose poll time has come."""
+        now = self._clock()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due.append(heapq.heappop(self._heap)[2])
+        return due
+
+
+class AdaptivePolicy:
+    """Chooses the delay before the next poll of an account.
+
+    Accounts with a homework under review are polled every active
+    seconds. Idle accounts and failing accounts back off exponentially
+    from base up to max_delay. Every delay is spread by jitter, taken
+    from rng so that the schedule can be reproduced.
+    """
+
+    def __init__(self, base, active, max_delay, jitter=0.1, rng=None):
+        """Starts with nothing known about the accounts."""
+        self.base = base
+        self.active = active
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.rng = rng or random.Random()
+        self._idle = {}
+        self._errors = {}
+        self._reviewing = set()
+
+    def on_success(self, key, statuses, known=None):
+        """Returns the delay after a successful poll.
+
+        statuses are the homework statuses changed by the poll, known
+        are all the saved statuses of the account after it (statuses
+        if not given). The account stays active while any of the known
+        homeworks is under review.
+        """
+        self._errors.pop(key, None)
+        if statuses:
+            self._idle.pop(key, None)
+        if statuses or known is not None:
+            self._reviewing.discard(key)
+            self.seed(key, statuses if known is None else known)
+        if key in self._reviewing:
+            return self._spread(self.active)
+        idle = self._idle.get(key, 0)
+        if not statuses:
+            self._idle[key] = idle + 1
+        return self._spread(self._backoff(idle))
+
+    def on_error(self, key, retry_after=None):
+        """Returns the delay after a failed poll."""
+        errors = self._errors.get(key, 0)
+        self._errors[key] = errors + 1
+        delay = self._spread(self._backoff(errors))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def seed(self, key, statuses):
+        """Marks the account active if a known homework is under review.
+
+        statuses are the saved homework statuses, so an account keeps
+        its pace after a restart.
+        """
+        if 'reviewing' in statuses:
+            self._reviewing.add(key)
+
+    def forget(self, key):
+        """Drops everything known about the account."""
+        self._idle.pop(key, None)
+        self._errors.pop(key, None)
+        self._reviewing.discard(key)
+
+    def _backoff(self, attempts):
+        return min(self.base * 2 ** min(attempts, 32), self.max_delay)
+
+    def _spread(self, delay):
+        if not self.jitter:
+            return delay
+        return delay * self.rng.uniform(1 - self.jitter, 1 + self.jitter)
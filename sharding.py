@@ -0,0 +1,89 @@
+"""Module for splitting the account roster between workers."""
+import bisect
+import fcntl
+import hashlib
+import os
+
+REPLICAS = 100
+
+
+def ring_hash(key):
+    """Returns a stable 64-bit hash of a string key."""
+    digest = hashlib.blake2b(key.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+class HashRing:
+    """Consistent hash ring that maps keys to nodes.
+
+    Every node owns several virtual points on the ring, so adding or
+    removing a node moves only the keys that node gains or loses.
+    """
+
+    def __init__(self, nodes, replicas=REPLICAS):
+        """Places every node on the ring replicas times."""
+        self.replicas = replicas
+        self._points = []
+        self._nodes = {}
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node):
+        """Places the virtual points of a node on the ring."""
+        for replica in range(self.replicas):
+            point = ring_hash(f'{node}#{replica}')
+            self._nodes[point] = node
+            bisect.insort(self._points, point)
+
+    def remove(self, node):
+        """Removes the virtual points of a node from the ring."""
+        for replica in range(self.replicas):
+            point = ring_hash(f'{node}#{replica}')
+            if self._nodes.get(point) == node:
+                del self._nodes[point]
+                self._points.remove(point)
+
+    def node_for(self, key):
+        """Returns the node that owns a key."""
+        if not self._points:
+            raise LookupError('Hash ring has no nodes')
+        index = bisect.bisect(self._points, ring_hash(key))
+        return self._nodes[self._points[index % len(self._points)]]
+
+
+def worker_name(index):
+    """Returns the ring node name of a worker."""
+    return f'worker-{index}'
+
+
+def shard_accounts(accounts, index, count, replicas=REPLICAS):
+    """Returns the accounts owned by the worker with the given index."""
+    if not 0 <= index < count:
+        raise ValueError(f'Worker index {index} is out of range 0..{count}')
+    ring = HashRing(
+        [worker_name(number) for number in range(count)], replicas)
+    owner = worker_name(index)
+    return [
+        account for account in accounts
+        if ring.node_for(account.name) == owner
+    ]
+
+
+def claim_worker_index(path, count):
+    """Claims a free worker index by locking one of the shared lock files.
+
+    Returns the index and the open lock file, which must stay open
+    for as long as the worker runs.
+    """
+    for index in range(count):
+        lock = open(f'{path}.{index}', 'a')
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock.close()
+            continue
+        lock.truncate(0)
+        lock.write(f'{os.getpid()}\n')
+        lock.flush()
+        return index, lock
+    raise RuntimeError(f'All {count} worker slots in {path} are taken')
@@ -0,0 +1,214 @@
+"""Module for storing the polling state between restarts."""
+import json
+import os
+import sqlite3
+import time
+
+
+class MemoryStateStore:
+    """Keeps the cursor, homework statuses and last error of accounts.
+
+    Reads are served from memory. Changes are collected and written
+    by flush in batches: at most every flush_interval seconds or when
+    max_pending changes have accumulated.
+    """
+
+    def __init__(self, flush_interval=5, max_pending=1000,
+                 clock=time.monotonic):
+        """Starts with an empty state."""
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._clock = clock
+        self._cursors = {}
+        self._statuses = {}
+        self._errors = {}
+        self._pending = []
+        self._last_flush = clock()
+
+    def get_cursor(self, account):
+        """Returns the from_date for the next poll of the account."""
+        return self._cursors.get(account)
+
+    def set_cursor(self, account, timestamp):
+        """Remembers the from_date for the next poll of the account."""
+        if self._cursors.get(account) != timestamp:
+            self._apply(('cursor', account, timestamp))
+
+    def get_status(self, account, homework):
+        """Returns the last seen status of the homework."""
+        return self._statuses.get(account, {}).get(homework)
+
+    def get_statuses(self, account):
+        """Returns the last seen statuses of all homeworks of the account."""
+        return dict(self._statuses.get(account, {}))
+
+    def set_status(self, account, homework, status):
+        """Remembers the last seen status of the homework."""
+        if self.get_status(account, homework) != status:
+            self._apply(('status', account, homework, status))
+
+    def get_error(self, account):
+        """Returns the last error reported for the account."""
+        return self._errors.get(account, '')
+
+    def set_error(self, account, message):
+        """Remembers the last error reported for the account."""
+        if self._errors.get(account, '') != message:
+            self._apply(('error', account, message))
+
+    def flush(self, force=False):
+        """Writes the collected changes if it is time to do so."""
+        if not self._pending:
+            return
+        if not force and len(self._pending) < self.max_pending and (
+                self._clock() - self._last_flush < self.flush_interval):
+            return
+        self._write(self._pending)
+        self._pending = []
+        self._last_flush = self._clock()
+
+    def close(self):
+        """Writes all collected changes."""
+        self.flush(force=True)
+
+    def _apply(self, change, pending=True):
+        kind, account, *values = change
+        if kind == 'cursor':
+            self._cursors[account] = values[0]
+        elif kind == 'status':
+            self._statuses.setdefault(account, {})[values[0]] = values[1]
+        elif kind == 'error':
+            self._errors[account] = values[0]
+        else:
+            raise KeyError(f'Unknown state change {kind}')
+        if pending:
+            self._pending.append(change)
+
+    def _write(self, changes):
+        pass
+
+
+class FileStateStore(MemoryStateStore):
+    """Keeps the state in an append-only file of JSON lines."""
+
+    def __init__(self, path, **kwargs):
+        """Loads the file, compacting it if it has grown."""
+        super().__init__(**kwargs)
+        self.path = path
+        records = self._load(path) if os.path.exists(path) else 0
+        live = len(self._cursors) + len(self._errors) + sum(
+            len(statuses) for statuses in self._statuses.values())
+        if records > 2 * live:
+            self._compact()
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def _load(self, path):
+        """Applies the saved changes, cutting a torn last line."""
+        records = size = 0
+        with open(path, 'rb') as file:
+            for line in file:
+                if not line.endswith(b'\n'):
+                    break
+                size += len(line)
+                if line.strip():
+                    self._apply(tuple(json.loads(line)), pending=False)
+                    records += 1
+        if os.path.getsize(path) != size:
+            os.truncate(path, size)
+        return records
+
+    def _compact(self):
+        """Rewrites the file leaving only the current values."""
+        changes = [('cursor', account, timestamp)
+                   for account, timestamp in self._cursors.items()]
+        changes += [('status', account, homework, status)
+                    for account, statuses in self._statuses.items()
+                    for homework, status in statuses.items()]
+        changes += [('error', account, message)
+                    for account, message in self._errors.items()]
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as file:
+            self._dump(file, changes)
+        os.replace(temporary, self.path)
+
+    def _write(self, changes):
+        self._dump(self._file, changes)
+
+    @staticmethod
+    def _dump(file, changes):
+        file.write(''.join(
+            json.dumps(change, ensure_ascii=False) + '\n'
+            for change in changes))
+        file.flush()
+        os.fsync(file.fileno())
+
+    def close(self):
+        """Writes all collected changes and closes the file."""
+        super().close()
+        self._file.close()
+
+
+class SQLiteStateStore(MemoryStateStore):
+    """Keeps the state in an SQLite database."""
+
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS cursors '
+        '(account TEXT PRIMARY KEY, timestamp INTEGER)',
+        'CREATE TABLE IF NOT EXISTS statuses '
+        '(account TEXT, homework TEXT, status TEXT, '
+        'PRIMARY KEY (account, homework))',
+        'CREATE TABLE IF NOT EXISTS errors '
+        '(account TEXT PRIMARY KEY, message TEXT)',
+    )
+    QUERIES = {
+        'cursor': 'INSERT OR REPLACE INTO cursors VALUES (?, ?)',
+        'status': 'INSERT OR REPLACE INTO statuses VALUES (?, ?, ?)',
+        'error': 'INSERT OR REPLACE INTO errors VALUES (?, ?)',
+    }
+
+    def __init__(self, path, **kwargs):
+        """Creates the tables if needed and loads them."""
+        super().__init__(**kwargs)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        for query in self.SCHEMA:
+            self.connection.execute(query)
+        for account, timestamp in self.connection.execute(
+                'SELECT account, timestamp FROM cursors'):
+            self._cursors[account] = timestamp
+        for account, homework, status in self.connection.execute(
+                'SELECT account, homework, status FROM statuses'):
+            self._statuses.setdefault(account, {})[homework] = status
+        for account, message in self.connection.execute(
+                'SELECT account, message FROM errors'):
+            self._errors[account] = message
+
+    def _write(self, changes):
+        with self.connection:
+            for kind, *values in changes:
+                self.connection.execute(self.QUERIES[kind], values)
+
+    def close(self):
+        """Writes all collected changes and closes the database."""
+        super().close()
+        self.connection.close()
+
+
+STORES = {
+    'sqlite': SQLiteStateStore,
+    'file': FileStateStore,
+}
+
+
+def open_state_store(url):
+    """Opens the store described by url.
+
+    sqlite:path and file:path are supported, without url
+    the state is kept in memory only.
+    """
+    if not url:
+        return MemoryStateStore()
+    kind, _, path = url.partition(':')
+    if kind not in STORES or not path:
+        raise ValueError(f'Unsupported state store {url}')
+    return STORES[kind](path)
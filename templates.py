@@ -0,0 +1,78 @@
+"""Module for message templates in several languages."""
+import json
+
+
+class Fields(dict):
+    """Homework fields where missing ones are rendered empty.
+
+    A missing homework_name is rendered as None, as parse_status
+    always did.
+    """
+
+    DEFAULTS = {'homework_name': 'None'}
+
+    def __missing__(self, key):
+        """Renders a missing field from DEFAULTS or as an empty string."""
+        return self.DEFAULTS.get(key, '')
+
+
+class TemplateRegistry:
+    """Message templates compiled once for every locale and status.
+
+    A template is a str.format string with the homework fields
+    (homework_name, lesson_name, reviewer_comment, date_updated...)
+    and {verdict}. The verdict of every status is substituted on
+    compile, so rendering is a single format_map call.
+    """
+
+    def __init__(self, default_locale):
+        """Starts with no templates."""
+        self.default_locale = default_locale
+        self._sources = {}
+        self._compiled = {}
+
+    def register(self, locale, template=None, verdicts=None):
+        """Adds or updates the template and verdicts of the locale."""
+        old_template, old_verdicts = self._sources.get(locale, (None, {}))
+        self._sources[locale] = (
+            template or old_template, {**old_verdicts, **(verdicts or {})})
+
+    def compile(self):
+        """Prepares the render functions of all locales and statuses."""
+        default_template, default_verdicts = self._sources[
+            self.default_locale]
+        compiled = {}
+        for locale, (template, verdicts) in self._sources.items():
+            template = template or default_template
+            for status in {**default_verdicts, **verdicts}:
+                verdict = verdicts.get(status, default_verdicts.get(status))
+                compiled[(locale, status)] = template.replace(
+                    '{verdict}', escape(verdict)).format_map
+        self._compiled = compiled
+        return self
+
+    def render(self, locale, homework):
+        """Returns the message about the homework in the locale."""
+        status = homework.get('status')
+        render = self._compiled.get((locale, status))
+        if render is None:
+            render = self._compiled[(self.default_locale, status)]
+        return render(Fields(homework))
+
+    def load(self, path):
+        """Registers the locales from a JSON file.
+
+        The file maps locales to objects with the optional keys
+        template and verdicts.
+        """
+        with open(path, encoding='utf-8') as file:
+            locales = json.load(file)
+        for locale, source in locales.items():
+            self.register(
+                locale, source.get('template'), source.get('verdicts'))
+        return self
+
+
+def escape(text):
+    """Protects braces of the text from str.format."""
+    return text.replace('{', '{{').replace('}', '}}')
@@ -0,0 +1,39 @@
+import json
+
+import pytest
+
+from accounts import Account, auth_headers, load_accounts
+
+
+class TestAccounts:
+
+    def test_load_accounts(self, tmp_path):
+        path = tmp_path / 'accounts.json'
+        path.write_text(json.dumps([
+            {'name': 'first', 'token': 'token1', 'chat_id': 1},
+            {'name': 'second', 'token': 'token2', 'chat_id': 2},
+        ]))
+        accounts = load_accounts(path)
+        assert accounts == [
+            Account('first', 'token1', 1),
+            Account('second', 'token2', 2),
+        ], 'Check that every account from the roster is loaded'
+
+    def test_load_accounts_missing_key(self, tmp_path):
+        path = tmp_path / 'accounts.json'
+        path.write_text(json.dumps([{'name': 'first', 'chat_id': 1}]))
+        with pytest.raises(KeyError):
+            load_accounts(path)
+
+    def test_load_accounts_duplicate_name(self, tmp_path):
+        path = tmp_path / 'accounts.json'
+        path.write_text(json.dumps([
+            {'name': 'first', 'token': 'token1', 'chat_id': 1},
+            {'name': 'first', 'token': 'token2', 'chat_id': 2},
+        ]))
+        with pytest.raises(KeyError):
+            load_accounts(path)
+
+    def test_auth_headers(self):
+        assert auth_headers('abc') == {'Authorization': 'OAuth abc'}
+
@@ -0,0 +1,299 @@
+import json
+import threading
+import time
+from http import HTTPStatus
+
+import pytest
+import requests
+
+import api_client
+import homework
+from accounts import Account
+from api_client import (CircuitBreaker, PracticumClient, SingleFlight,
+                        TTLCache, create_session, project_response)
+from exceptions import (APIRateLimitException, APIValueException,
+                        CircuitOpenException)
+from state import MemoryStateStore
+from utils import FakeClock, MockBodyResponse, MockResponse, MockSession
+
+ENDPOINT = 'https://practicum.yandex.ru/api/user_api/homework_statuses/'
+
+
+class MockOutbox:
+
+    def __init__(self):
+        self.published = []
+        self.errors = []
+
+    def publish(self, account, text):
+        self.published.append(text)
+
+    def put(self, chat_id, text, priority):
+        self.errors.append(text)
+
+
+class RaisingSession:
+
+    def get(self, **kwargs):
+        raise requests.exceptions.ChunkedEncodingError('broken')
+
+
+class TestCircuitBreaker:
+
+    def test_opens_and_recovers(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=2, recovery_time=30,
+                                 clock=clock)
+        breaker.record_failure()
+        assert breaker.allow()
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+        assert not breaker.allow()
+        clock.now = 30
+        assert breaker.allow(), 'Check that a probe is let through'
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert not breaker.allow(), 'Check that only one probe is sent'
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+        clock.now = 60
+        assert breaker.allow()
+        breaker.record_success()
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    def test_unexpected_error_reopens(self, current_timestamp):
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=1, recovery_time=30,
+                                 clock=clock)
+        client = PracticumClient(
+            ENDPOINT, session=RaisingSession(), breaker=breaker)
+        breaker.record_failure()
+        clock.now = 30
+        with pytest.raises(requests.exceptions.ChunkedEncodingError):
+            client.get_homeworks({}, current_timestamp)
+        assert breaker.state == CircuitBreaker.OPEN, (
+            'Check that a probe failing with any error opens the circuit'
+        )
+
+    def test_shared_by_accounts(self, current_timestamp):
+        session = MockSession(
+            MockResponse(status_code=HTTPStatus.BAD_GATEWAY))
+        breaker = CircuitBreaker(failure_threshold=2, clock=FakeClock())
+        client = PracticumClient(ENDPOINT, session=session, breaker=breaker)
+        for token in ('first', 'second'):
+            with pytest.raises(APIValueException):
+                client.get_homeworks(
+                    {'Authorization': f'OAuth {token}'}, current_timestamp)
+        with pytest.raises(CircuitOpenException):
+            client.get_homeworks(
+                {'Authorization': 'OAuth third'}, current_timestamp)
+        assert len(session.calls) == 2, (
+            'Check that no request is sent while the circuit is open'
+        )
+
+    def test_client_errors_do_not_open(self, current_timestamp):
+        session = MockSession(
+            MockResponse(status_code=HTTPStatus.UNAUTHORIZED))
+        breaker = CircuitBreaker(failure_threshold=1)
+        client = PracticumClient(ENDPOINT, session=session, breaker=breaker)
+        with pytest.raises(APIValueException):
+            client.get_homeworks({}, current_timestamp)
+        assert breaker.state == CircuitBreaker.CLOSED
+
+
+class TestCoalescing:
+
+    def test_single_flight_shares_call(self):
+        flights = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def slow_call():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return 'answer'
+
+        results = []
+        leader = threading.Thread(
+            target=lambda: results.append(flights.do('key', slow_call)))
+        leader.start()
+        started.wait(5)
+        follower = threading.Thread(
+            target=lambda: results.append(flights.do('key', slow_call)))
+        follower.start()
+        time.sleep(0.1)
+        release.set()
+        leader.join(5)
+        follower.join(5)
+        assert calls == [1], 'Check that concurrent requests share one call'
+        assert sorted(results) == [('answer', False), ('answer', True)]
+
+    def test_single_flight_passes_errors(self):
+        flights = SingleFlight()
+        with pytest.raises(KeyError):
+            flights.do('key', lambda: {}['missing'])
+        assert flights.do('key', lambda: 1) == (1, False)
+
+    def test_ttl_cache_expires_and_evicts(self):
+        clock = FakeClock()
+        cache = TTLCache(ttl=5, size=2, clock=clock)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        assert cache.get('a') == 1
+        cache.put('c', 3)
+        assert cache.get('b') is None, (
+            'Check that the least recently used value is evicted'
+        )
+        assert cache.get('a') == 1
+        clock.now = 5
+        assert cache.get('a') is None
+
+    def test_client_reuses_recent_answer(self, random_timestamp,
+                                         current_timestamp):
+        data = {'homeworks': [], 'current_date': random_timestamp}
+        session = MockSession(MockResponse(data=data))
+        client = PracticumClient(ENDPOINT, session=session, cache_ttl=5)
+        headers = {'Authorization': 'OAuth token'}
+        client.fetch(headers, current_timestamp)
+        assert client.fetch(headers, current_timestamp) == (data, True)
+        assert len(session.calls) == 1
+        assert client.stats['cache_hits'] == 1
+        client.fetch(headers, current_timestamp + 1)
+        assert len(session.calls) == 2
+
+
+class TestPracticumClient:
+
+    def test_get_homeworks_through_session(self, random_timestamp,
+                                           current_timestamp):
+        data = {'homeworks': [], 'current_date': random_timestamp}
+        session = MockSession(MockResponse(data=data))
+        client = PracticumClient(ENDPOINT, session=session, timeout=5)
+        headers = {'Authorization': 'OAuth token'}
+        assert client.get_homeworks(headers, current_timestamp) == data
+        assert session.calls == [{
+            'url': ENDPOINT,
+            'headers': headers,
+            'params': {'from_date': current_timestamp},
+            'timeout': 5,
+        }], 'Check that the request goes through the session with a timeout'
+
+    def test_get_homeworks_error_status(self, current_timestamp):
+        session = MockSession(
+            MockResponse(status_code=HTTPStatus.INTERNAL_SERVER_ERROR))
+        client = PracticumClient(ENDPOINT, session=session)
+        with pytest.raises(APIValueException):
+            client.get_homeworks({}, current_timestamp)
+
+    def test_get_homeworks_retry_after(self, current_timestamp):
+        session = MockSession(MockResponse(
+            status_code=HTTPStatus.TOO_MANY_REQUESTS,
+            headers={'Retry-After': '120'}))
+        client = PracticumClient(ENDPOINT, session=session)
+        with pytest.raises(APIRateLimitException) as error:
+            client.get_homeworks({}, current_timestamp)
+        assert error.value.retry_after == 120
+
+    def test_conditional_request_not_modified(self, random_timestamp,
+                                              current_timestamp):
+        data = {'homeworks': [], 'current_date': random_timestamp}
+        session = MockSession(
+            MockBodyResponse(data, headers={'ETag': '"v1"'}))
+        client = PracticumClient(ENDPOINT, session=session)
+        headers = {'Authorization': 'OAuth token'}
+        assert client.fetch(headers, current_timestamp) == (data, True)
+        assert 'If-None-Match' not in session.calls[0]['headers']
+
+        session.response = MockResponse(status_code=HTTPStatus.NOT_MODIFIED)
+        assert client.fetch(headers, current_timestamp) == (data, False), (
+            'Check that the previous answer is reused on 304 Not Modified'
+        )
+        assert session.calls[1]['headers']['If-None-Match'] == '"v1"'
+        assert client.stats['not_modified'] == 1
+        assert client.stats['changed'] == 1
+        assert client.stats['bytes_saved'] == len(json.dumps(data))
+
+    def test_unchanged_body_is_not_decoded(self, monkeypatch,
+                                           random_timestamp,
+                                           current_timestamp):
+        decoded = []
+
+        def counting_loads(content):
+            decoded.append(content)
+            return json.loads(content)
+
+        monkeypatch.setattr(api_client, 'json_loads', counting_loads)
+        data = {'homeworks': [], 'current_date': random_timestamp}
+        response = MockBodyResponse(data)
+        client = PracticumClient(ENDPOINT, session=MockSession(response))
+        headers = {'Authorization': 'OAuth token'}
+        client.fetch(headers, current_timestamp)
+        assert client.fetch(headers, current_timestamp + 1) == (data, False)
+        assert len(decoded) == 1, (
+            'Check that an identical body is not decoded again'
+        )
+        assert client.stats['unchanged_body'] == 1
+
+    def test_answer_is_projected(self, current_timestamp):
+        data = {
+            'homeworks': [{
+                'id': 1, 'homework_name': 'hw1', 'status': 'approved',
+                'reviewer': {'id': 5, 'first_name': 'Ivan'},
+                'lesson_name': 'Final project'}],
+            'current_date': 100,
+            'extra': 'ignored',
+        }
+        client = PracticumClient(
+            ENDPOINT, session=MockSession(MockBodyResponse(data)))
+        assert client.get_homeworks({}, current_timestamp) == {
+            'homeworks': [{'id': 1, 'homework_name': 'hw1',
+                           'status': 'approved',
+                           'lesson_name': 'Final project'}],
+            'current_date': 100,
+        }
+
+    def test_project_keeps_invalid_answers(self):
+        assert project_response([1]) == [1]
+        assert project_response({'homeworks': {}}) == {'homeworks': {}}
+        assert project_response({}) == {}
+
+    def test_create_session_pool_size(self):
+        session = create_session(pool_size=25)
+        adapter = session.get_adapter(ENDPOINT)
+        assert adapter._pool_maxsize == 25
+        assert adapter._pool_connections == 25
+
+    def test_forget_reports_answer_again(self, current_timestamp):
+        data = {'homeworks': [], 'current_date': current_timestamp}
+        client = PracticumClient(
+            ENDPOINT, session=MockSession(MockBodyResponse(data)))
+        headers = {'Authorization': 'OAuth token'}
+        client.fetch(headers, current_timestamp)
+        client.forget(headers)
+        assert client.fetch(headers, current_timestamp + 1) == (data, True)
+
+
+class TestPollAccount:
+
+    def test_failed_answer_is_processed_again(self, monkeypatch):
+        data = {'homeworks': [
+            {'id': 1, 'homework_name': 'hw1', 'status': 'approved'},
+            {'id': 2, 'homework_name': 'hw2', 'status': 'unknown'},
+        ], 'current_date': 999}
+        client = PracticumClient(
+            ENDPOINT, session=MockSession(MockBodyResponse(data)),
+            breaker=CircuitBreaker())
+        monkeypatch.setattr(homework, 'api_client', client)
+        outbox = MockOutbox()
+        store = MemoryStateStore()
+        store.set_cursor('student', 100)
+        account = Account('student', 'token', 1)
+        for _ in range(2):
+            homework.poll_account(
+                outbox, account, store, homework.create_policy())
+        assert store.get_cursor('student') == 100, (
+            'Check that an answer that failed is not skipped as unchanged'
+        )
+        assert 'Unexpected Status' in store.get_error('student')
+        assert outbox.published == []
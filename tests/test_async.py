@@ -0,0 +1,190 @@
+import asyncio
+import json
+from http import HTTPStatus
+
+import pytest
+
+import homework
+from accounts import Account
+from exceptions import APIValueException
+from outbox import ERROR_PRIORITY
+from state import MemoryStateStore
+
+
+class MockAsyncResponse:
+
+    def __init__(self, status=HTTPStatus.OK, data=None, headers=None):
+        self.status = status
+        self.data = data
+        self.headers = headers or {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    async def read(self):
+        return json.dumps(self.data).encode()
+
+
+class MockAsyncSession:
+
+    def __init__(self, response):
+        self.response = response
+        self.calls = []
+
+    def get(self, url, headers=None, params=None):
+        self.calls.append(('get', url, headers, params))
+        return self.response
+
+
+class SlowAsyncResponse(MockAsyncResponse):
+
+    async def read(self):
+        await asyncio.sleep(0.01)
+        return await super().read()
+
+
+class MockOutbox:
+
+    def __init__(self):
+        self.published = []
+        self.errors = []
+
+    def publish(self, account, text):
+        self.published.append((account.name, text))
+
+    def put(self, chat_id, text, priority):
+        self.errors.append((chat_id, text, priority))
+
+
+@pytest.fixture(autouse=True)
+def api_client(monkeypatch):
+    client = homework.PracticumClient(
+        homework.ENDPOINT, breaker=homework.CircuitBreaker())
+    monkeypatch.setattr(homework, 'api_client', client)
+    return client
+
+
+class TestAsync:
+
+    def test_get_api_answer_async(self, random_timestamp, current_timestamp):
+        data = {'homeworks': [], 'current_date': random_timestamp}
+        session = MockAsyncSession(MockAsyncResponse(data=data))
+        result = asyncio.run(
+            homework.get_api_answer_async(session, current_timestamp))
+        assert result == data
+        _, url, headers, params = session.calls[0]
+        assert url == homework.ENDPOINT
+        assert headers['Authorization'].startswith('OAuth ')
+        assert params == {'from_date': current_timestamp}
+
+    def test_get_500_api_answer_async(self, current_timestamp):
+        session = MockAsyncSession(
+            MockAsyncResponse(status=HTTPStatus.INTERNAL_SERVER_ERROR))
+        with pytest.raises(APIValueException):
+            asyncio.run(
+                homework.get_api_answer_async(session, current_timestamp))
+
+    def test_unexpected_error_reopens_circuit(self, monkeypatch, api_client,
+                                              current_timestamp):
+        breaker = homework.CircuitBreaker(failure_threshold=1)
+        monkeypatch.setattr(api_client, 'breaker', breaker)
+        session = MockAsyncSession(MockAsyncResponse())
+
+        def broken_get(url, headers=None, params=None):
+            raise homework.aiohttp.ClientPayloadError('broken')
+
+        session.get = broken_get
+        with pytest.raises(homework.aiohttp.ClientPayloadError):
+            asyncio.run(
+                homework.get_api_answer_async(session, current_timestamp))
+        assert breaker.state == homework.CircuitBreaker.OPEN
+
+    def test_conditional_request_not_modified(self, api_client,
+                                              current_timestamp):
+        data = {'homeworks': [], 'current_date': current_timestamp}
+        session = MockAsyncSession(
+            MockAsyncResponse(data=data, headers={'ETag': '"v1"'}))
+        headers = {'Authorization': 'OAuth token'}
+        fetch = api_client.fetch_async
+        assert asyncio.run(fetch(session, headers, current_timestamp)) == (
+            data, True)
+        session.response = MockAsyncResponse(status=HTTPStatus.NOT_MODIFIED)
+        assert asyncio.run(fetch(session, headers, current_timestamp)) == (
+            data, False), (
+            'Check that the asynchronous poll sends conditional requests'
+        )
+        assert session.calls[1][2]['If-None-Match'] == '"v1"'
+        session.response = MockAsyncResponse(data=data)
+        assert asyncio.run(fetch(session, headers, current_timestamp + 1)) == (
+            data, False)
+        assert api_client.stats == {
+            'requests': 3, 'changed': 1, 'not_modified': 1,
+            'unchanged_body': 1, 'bytes_saved': len(json.dumps(data))}
+
+    def test_identical_requests_are_coalesced(self, api_client,
+                                              current_timestamp):
+        data = {'homeworks': [], 'current_date': current_timestamp}
+        session = MockAsyncSession(SlowAsyncResponse(data=data))
+        headers = {'Authorization': 'OAuth token'}
+
+        async def fetch_twice():
+            return await asyncio.gather(*(
+                api_client.fetch_async(session, headers, current_timestamp)
+                for _ in range(2)))
+
+        assert asyncio.run(fetch_twice()) == [(data, True), (data, True)]
+        assert len(session.calls) == 1, (
+            'Check that concurrent identical requests share one call'
+        )
+        assert api_client.stats['coalesced'] == 1
+
+    def test_poll_skips_unchanged_answer(self):
+        data = {'homeworks': [
+            {'homework_name': 'hw1', 'status': 'approved'},
+        ], 'current_date': 1000}
+        session = MockAsyncSession(MockAsyncResponse(data=data))
+        outbox = MockOutbox()
+        store = MemoryStateStore()
+        account = Account('student', 'token', 1)
+        policy = homework.create_policy()
+        asyncio.run(homework.poll_once_async(
+            session, outbox, account, store, policy))
+        store.set_status('student', 'hw1', 'reviewing')
+        asyncio.run(homework.poll_once_async(
+            session, outbox, account, store, policy))
+        assert len(outbox.published) == 1, (
+            'Check that an unchanged answer is not processed again'
+        )
+
+    def test_poll_queues_messages_to_outbox(self, monkeypatch):
+        data = {'homeworks': [
+            {'homework_name': 'hw1', 'status': 'approved'},
+        ], 'current_date': 1000}
+        session = MockAsyncSession(MockAsyncResponse(data=data))
+        outbox = MockOutbox()
+        store = MemoryStateStore()
+        store.set_cursor('student', 100)
+        delay = asyncio.run(homework.poll_once_async(
+            session, outbox, Account('student', 'token', 1), store,
+            homework.create_policy()))
+        assert delay > 0
+        assert outbox.published == [
+            ('student', homework.parse_status(data['homeworks'][0]))], (
+            'Check that the asynchronous poll sends through the outbox'
+        )
+        assert [call[0] for call in session.calls] == ['get']
+        assert store.get_cursor('student') == 1000
+
+    def test_poll_error_is_queued_with_priority(self):
+        session = MockAsyncSession(
+            MockAsyncResponse(status=HTTPStatus.INTERNAL_SERVER_ERROR))
+        outbox = MockOutbox()
+        asyncio.run(homework.poll_once_async(
+            session, outbox, Account('student', 'token', 1),
+            MemoryStateStore(), homework.create_policy()))
+        (chat_id, text, priority), = outbox.errors
+        assert chat_id == 1
+        assert priority == ERROR_PRIORITY
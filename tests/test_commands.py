@@ -0,0 +1,139 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import homework
+from accounts import Account
+from commands import CommandListener, TransitionHistory
+from state import MemoryStateStore
+from transitions import Transition
+
+
+class MockUpdatesBot:
+
+    def __init__(self, updates):
+        self.updates = updates
+        self.calls = []
+
+    def get_updates(self, offset=None, timeout=None, **kwargs):
+        self.calls.append(offset)
+        updates, self.updates = self.updates, []
+        return updates
+
+
+def update(update_id, chat_id, text):
+    return SimpleNamespace(
+        update_id=update_id,
+        message=SimpleNamespace(chat_id=chat_id, text=text))
+
+
+class TestCommands:
+
+    def test_listener_answers_known_commands(self):
+        bot = MockUpdatesBot([
+            update(10, 1, '/status'),
+            update(11, 2, 'hello'),
+            update(12, 3, '/history@homework_bot'),
+        ])
+        replies = []
+        listener = CommandListener(
+            bot, {'/status': lambda chat_id: f'status {chat_id}',
+                  '/history': lambda chat_id: f'history {chat_id}'},
+            lambda chat_id, text: replies.append((chat_id, text)))
+        listener.poll()
+        listener.poll()
+        assert replies == [(1, 'status 1'), (3, 'history 3')]
+        assert bot.calls == [None, 13], (
+            'Check that received updates are confirmed with offset'
+        )
+
+    def test_history_size(self):
+        history = TransitionHistory(size=2)
+        history.add('student', [1, 2, 3], received_at=100)
+        assert [item for _, item in history.get('student')] == [2, 3]
+        assert history.get('other') == []
+
+    def test_status_command_from_store(self):
+        store = MemoryStateStore()
+        store.set_status('student', 'hw1', 'approved')
+        store.set_status('other', 'hw2', 'rejected')
+        accounts = [Account('student', 'token', 1),
+                    Account('other', 'token', 2)]
+        assert homework.status_command(store, accounts, '1') == (
+            'student:\nhw1: approved')
+        assert homework.status_command(store, accounts, 3) == (
+            'No accounts are linked to this chat')
+
+    def test_history_command(self):
+        accounts = [Account('history_student', 'token', 5)]
+        homework.history.add('history_student', [Transition(
+            {'homework_name': 'hw1'}, 'reviewing', 'approved')])
+        text = homework.history_command(accounts, 5)
+        assert text.startswith('history_student:\n')
+        assert text.endswith('hw1: reviewing -> approved')
+
+    def test_listener_runs_with_async_polling(self, monkeypatch):
+        started = []
+
+        class MockListener:
+
+            def start(self):
+                started.append(True)
+
+            def stop(self, timeout):
+                pass
+
+        async def main_async(outbox, accounts, store, lifecycle, reload):
+            assert started, 'Check that commands are received before polling'
+
+        outbox = SimpleNamespace(start=lambda: None, stop=lambda timeout: None)
+        monkeypatch.setattr(homework, 'ASYNC_POLLING', True)
+        monkeypatch.setattr(homework, 'TELEGRAM_COMMANDS', True)
+        monkeypatch.setattr(homework, 'create_bot', lambda: None)
+        monkeypatch.setattr(homework, 'create_outbox', lambda bot: outbox)
+        monkeypatch.setattr(
+            homework, 'create_command_listener',
+            lambda bot, outbox, store, accounts: MockListener())
+        monkeypatch.setattr(homework, 'main_async', main_async)
+        homework.run_polling([], MemoryStateStore(), None, None)
+        assert started == [True], (
+            'Check that TELEGRAM_COMMANDS works with ASYNC_POLLING'
+        )
+
+    def test_shutdown_does_not_wait_for_long_polling(self, monkeypatch):
+        release = threading.Event()
+        stopped = []
+        bots = []
+
+        class BlockingBot:
+
+            def __init__(self):
+                bots.append(self)
+
+            def get_updates(self, **kwargs):
+                release.wait(5)
+                return []
+
+        def create_outbox(bot):
+            assert bot is bots[0]
+            return SimpleNamespace(
+                start=lambda: None, put=lambda chat_id, text: None,
+                stop=lambda timeout: stopped.append(time.monotonic()))
+
+        async def main_async(outbox, accounts, store, lifecycle, reload):
+            pass
+
+        monkeypatch.setattr(homework, 'ASYNC_POLLING', True)
+        monkeypatch.setattr(homework, 'TELEGRAM_COMMANDS', True)
+        monkeypatch.setattr(homework, 'create_bot', BlockingBot)
+        monkeypatch.setattr(homework, 'create_outbox', create_outbox)
+        monkeypatch.setattr(homework, 'main_async', main_async)
+        started = time.monotonic()
+        homework.run_polling([], MemoryStateStore(), None, None)
+        release.set()
+        assert stopped[0] - started < 1, (
+            'Check that the outbox is stopped without waiting for getUpdates'
+        )
+        assert len(bots) == 2, (
+            'Check that the listener has its own bot'
+        )
@@ -0,0 +1,97 @@
+import json
+import threading
+import time
+
+import pytest
+
+from accounts import Account
+from fanout import FanOut, FileSink, Subscriptions, parse_destination
+from outbox import Outbox
+
+ACCOUNT = Account('student', 'token', 1)
+
+
+class Recorder:
+
+    def __init__(self, delay=0, error=None):
+        self.sent = []
+        self.delay = delay
+        self.error = error
+        self.done = threading.Event()
+
+    def __call__(self, target, text):
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        self.sent.append((target, text))
+        self.done.set()
+
+
+def subscriptions(tmp_path, data):
+    path = tmp_path / 'subscriptions.json'
+    path.write_text(json.dumps(data))
+    return Subscriptions().load(path)
+
+
+class TestSubscriptions:
+
+    def test_parse_destination(self):
+        assert parse_destination('webhook:http://host/hook') == (
+            'webhook', 'http://host/hook')
+        with pytest.raises(ValueError):
+            parse_destination('smtp:admin@example.com')
+
+    def test_destinations_include_wildcard(self, tmp_path):
+        loaded = subscriptions(tmp_path, {
+            'student': ['telegram:-100', 'file:all.log'],
+            '*': ['file:all.log'],
+        })
+        assert loaded.destinations('student') == [
+            ('telegram', '-100'), ('file', 'all.log')]
+        assert loaded.destinations('other') == [('file', 'all.log')]
+
+
+class TestFanOut:
+
+    def test_publish_to_every_destination(self, tmp_path):
+        telegram = Recorder()
+        webhook = Recorder()
+        fanout = FanOut(
+            Outbox(telegram, 100, 100),
+            subscriptions(tmp_path, {'student': [
+                'telegram:-100', 'webhook:http://hook']}),
+            {'webhook': webhook}, rate=100)
+        fanout.publish(ACCOUNT, 'text')
+        assert len(fanout) == 3
+        fanout.start()
+        assert fanout.stop(5) == 0
+        assert telegram.sent == [(1, 'text'), ('-100', 'student: text')], (
+            'Check that Telegram subscribers share the outbox of the bot'
+        )
+        assert webhook.sent == [('http://hook', 'student: text')]
+
+    def test_slow_and_failing_subscribers_are_independent(self, tmp_path):
+        telegram = Recorder()
+        slow = Recorder(delay=1)
+        failing = Recorder(error=ConnectionError('refused'))
+        fanout = FanOut(
+            Outbox(telegram, 100, 100),
+            subscriptions(tmp_path, {'student': [
+                'webhook:http://slow', 'file:broken.log']}),
+            {'webhook': slow, 'file': failing}, rate=100)
+        fanout.start()
+        fanout.publish(ACCOUNT, 'text')
+        assert telegram.done.wait(0.5), (
+            'Check that a slow subscriber does not delay the others'
+        )
+        assert slow.done.wait(5)
+        fanout.stop(0)
+
+    def test_file_sink(self, tmp_path):
+        path = tmp_path / 'homework.log'
+        sink = FileSink(clock=lambda: 100)
+        sink(str(path), 'first')
+        sink(str(path), 'second')
+        lines = path.read_text().splitlines()
+        assert [json.loads(line) for line in lines] == [
+            {'time': 100, 'text': 'first'}, {'time': 100, 'text': 'second'}]
@@ -0,0 +1,126 @@
+import threading
+import time
+
+import pytest
+
+import homework
+from accounts import Account
+from api_client import PracticumClient
+from importer import bounded_map
+from journal import Journal
+from utils import MockResponse
+
+
+class HistorySession:
+
+    def __init__(self, histories):
+        self.histories = histories
+        self.params = []
+
+    def get(self, url, headers=None, params=None, timeout=None):
+        self.params.append(params)
+        token = headers['Authorization'].split()[-1]
+        return MockResponse(data=self.histories[token])
+
+
+class TestBoundedMap:
+
+    def test_concurrency_is_bounded(self):
+        lock = threading.Lock()
+        running = []
+        peak = []
+
+        def work(item):
+            with lock:
+                running.append(item)
+                peak.append(len(running))
+            time.sleep(0.01)
+            with lock:
+                running.remove(item)
+            if item == 3:
+                raise ValueError('broken')
+            return item * 2
+
+        results = sorted(
+            (item, result, error is not None)
+            for item, result, error in bounded_map(work, iter(range(20)), 4))
+        assert max(peak) <= 4, 'Check that at most workers calls run at once'
+        assert results[3] == (3, None, True)
+        assert results[5] == (5, 10, False)
+        assert len(results) == 20
+
+    def test_items_are_taken_lazily(self):
+        taken = []
+
+        def items():
+            for number in range(100):
+                taken.append(number)
+                yield number
+
+        results = bounded_map(lambda item: item, items(), 2)
+        next(results)
+        results.close()
+        assert len(taken) < 10, 'Check that the input is not read at once'
+
+
+class TestImportHistory:
+
+    @pytest.fixture
+    def history(self, monkeypatch, tmp_path):
+        histories = {
+            'token1': {'homeworks': [
+                {'homework_name': 'hw2', 'status': 'reviewing',
+                 'date_updated': '2022-02-01T00:00:00Z'},
+                {'homework_name': 'hw1', 'status': 'approved',
+                 'date_updated': '2022-01-01T00:00:00Z'},
+            ], 'current_date': 1000},
+            'token2': {'homeworks': [], 'current_date': 1000},
+            'token3': {'homeworks': 'broken'},
+            'token4': {'homeworks': [
+                {'homework_name': 'hw1', 'status': 'approved',
+                 'date_updated': '2022-01-01T00:00:00Z'},
+                {'homework_name': 'hw2', 'status': 'unknown',
+                 'date_updated': '2022-02-01T00:00:00Z'},
+            ], 'current_date': 1000},
+        }
+        session = HistorySession(histories)
+        client = PracticumClient(homework.ENDPOINT)
+        monkeypatch.setattr(homework, 'api_client', client)
+        monkeypatch.setattr(homework, 'create_session', lambda size: session)
+        monkeypatch.setattr(homework, 'load_roster', lambda: [
+            Account(f'student{number}', f'token{number}', number)
+            for number in (1, 2, 3, 4)
+        ])
+        monkeypatch.setattr(
+            homework, 'STATE_STORE', f'file:{tmp_path / "state.jsonl"}')
+        journal = Journal(str(tmp_path / 'journal'))
+        monkeypatch.setattr(homework, 'journal', journal)
+        return session, journal
+
+    def test_import_history(self, history, monkeypatch):
+        session, journal = history
+        sent = []
+        monkeypatch.setattr(homework, 'send_message', sent.append)
+        homework.import_history(['--workers', '2'])
+        assert {params['from_date'] for params in session.params} == {0}, (
+            'Check that the history is requested from from_date=0'
+        )
+        store = homework.open_state_store(homework.STATE_STORE)
+        assert store.get_statuses('student1') == {
+            'hw1': 'approved', 'hw2': 'reviewing'}
+        assert store.get_cursor('student1') == 1000
+        assert store.get_cursor('student2') is None
+        assert [event.homework['homework_name']
+                for event in journal.read()] == ['hw1', 'hw2'], (
+            'Check that the history is journaled from the oldest change'
+        )
+        assert sent == [], 'Check that the import sends no messages'
+        assert store.get_statuses('student4') == {}, (
+            'Check that a history with an unknown status is not imported'
+        )
+        assert store.get_cursor('student4') is None
+
+    def test_import_selected_accounts(self, history):
+        session, _ = history
+        homework.import_history(['--account', 'student2'])
+        assert len(session.params) == 1
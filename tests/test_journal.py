@@ -0,0 +1,150 @@
+import json
+import os
+
+import pytest
+
+import homework
+from accounts import Account
+from journal import Event, Journal
+from transitions import Transition
+from utils import FakeClock
+
+
+def approved(name):
+    return {'homework_name': name, 'status': 'approved'}
+
+
+def fill(journal, events):
+    for number in range(events):
+        journal.append(f'student{number % 3}', approved(f'hw{number}'), 100)
+
+
+class TestJournal:
+
+    def test_read_range_and_accounts(self, tmp_path):
+        journal = Journal(str(tmp_path), index_every=4, clock=FakeClock(step=1))
+        fill(journal, 30)
+        events = list(journal.read(['student1'], since=10, until=20))
+        assert [event.received_at for event in events] == [11, 14, 17, 20]
+        event = events[0]
+        assert (event.account, event.status, event.current_date) == (
+            'student1', 'approved', 100)
+        assert event.homework == approved('hw10')
+
+    def test_segments_survive_reopen(self, tmp_path):
+        journal = Journal(
+            str(tmp_path), segment_size=500, index_every=4,
+            clock=FakeClock(step=1))
+        fill(journal, 30)
+        journal.close()
+        segments = [
+            name for name in os.listdir(tmp_path)
+            if name.startswith('segment-')
+        ]
+        assert len(segments) > 1, 'Check that big journals are segmented'
+        reopened = Journal(str(tmp_path), segment_size=500)
+        assert len(list(reopened.read())) == 30
+        assert len(list(reopened.read(since=25))) == 6
+
+    def test_torn_line_is_cut(self, tmp_path):
+        journal = Journal(str(tmp_path), clock=FakeClock(step=1))
+        fill(journal, 3)
+        journal.close()
+        segment = tmp_path / 'segment-00000001.jsonl'
+        with open(segment, 'ab') as file:
+            file.write(b'[4,"student')
+        reopened = Journal(str(tmp_path), clock=FakeClock(step=1))
+        reopened.append('student0', approved('hw3'), 100)
+        assert [event.homework['homework_name']
+                for event in reopened.read()] == ['hw0', 'hw1', 'hw2', 'hw3']
+
+
+class TestReplay:
+
+    def test_record_homeworks_writes_journal(self, monkeypatch, tmp_path):
+        journal = Journal(str(tmp_path))
+        monkeypatch.setattr(homework, 'journal', journal)
+        account = Account('student', 'token', 1)
+        transitions = [Transition(approved('hw1'), None, 'approved')]
+        homework.record_homeworks(
+            homework.open_state_store(None), account,
+            {'homeworks': [approved('hw1')], 'current_date': 100},
+            transitions)
+        events = list(journal.read())
+        assert [(event.account, event.current_date) for event in events] == [
+            ('student', 100)]
+
+    def test_replay_messages_in_bulk(self):
+        accounts = [Account('student', 'token', 1)]
+        events = [
+            Event(number, name, 'approved', 100, approved('hw'))
+            for number, name in enumerate(['student', 'unknown', 'student'])
+        ]
+        messages = list(homework.replay_messages(events, accounts))
+        assert len(messages) == 1, (
+            'Check that replayed events of a chat are joined'
+        )
+        assert messages[0][0] == 1
+        backfill = list(homework.replay_messages(events, accounts, 'new'))
+        assert [chat_id for chat_id, _ in backfill] == ['new']
+        assert backfill[0][1].count('unknown: ') == 1
+
+    def test_replay_skips_invalid_events(self):
+        accounts = [Account('student', 'token', 1)]
+        events = [
+            Event(1, 'student', 'unknown', 100,
+                  {'homework_name': 'hw1', 'status': 'unknown'}),
+            Event(2, 'student', 'approved', 100, approved('hw2')),
+        ]
+        messages = list(homework.replay_messages(events, accounts))
+        assert messages == [
+            (1, homework.parse_status(approved('hw2')))], (
+            'Check that an invalid event does not stop the replay'
+        )
+
+    def test_replay_stops_outbox_on_error(self, monkeypatch, tmp_path):
+        stopped = []
+
+        class MockOutbox:
+
+            def start(self):
+                pass
+
+            def put(self, chat_id, text):
+                raise RuntimeError('broken')
+
+            def stop(self):
+                stopped.append(True)
+
+        journal = Journal(str(tmp_path), clock=FakeClock(step=1))
+        fill(journal, 1)
+        monkeypatch.setattr(homework, 'journal', journal)
+        monkeypatch.setattr(homework, 'create_bot', lambda: None)
+        monkeypatch.setattr(homework, 'create_outbox', lambda bot: MockOutbox())
+        with pytest.raises(RuntimeError):
+            homework.replay_journal(['--chat-id', '42'])
+        assert stopped == [True], (
+            'Check that the queued messages are sent after an error'
+        )
+
+    def test_replay_journal_dry_run(self, monkeypatch, tmp_path, capsys):
+        journal = Journal(str(tmp_path), clock=FakeClock(step=1))
+        fill(journal, 3)
+        monkeypatch.setattr(homework, 'journal', journal)
+        homework.replay_journal(['--since', '2', '--dry-run',
+                                 '--chat-id', '42'])
+        lines = capsys.readouterr().out.splitlines()
+        assert lines[0].startswith('42: student1: ')
+        assert sum('student' in line for line in lines) == 2
+
+    def test_restore_state(self, monkeypatch, tmp_path):
+        journal = Journal(str(tmp_path / 'journal'), clock=FakeClock(step=1))
+        fill(journal, 3)
+        monkeypatch.setattr(homework, 'journal', journal)
+        monkeypatch.setattr(
+            homework, 'STATE_STORE', f'file:{tmp_path / "state.jsonl"}')
+        homework.replay_journal(['--restore-state'])
+        store = homework.open_state_store(homework.STATE_STORE)
+        assert store.get_statuses('student0') == {'hw0': 'approved'}
+        lines = (tmp_path / 'state.jsonl').read_text().splitlines()
+        assert json.loads(lines[0])[0] == 'status'
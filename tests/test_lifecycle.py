@@ -0,0 +1,82 @@
+import os
+import signal
+import threading
+import time
+
+import pytest
+
+import homework
+from accounts import Account
+from lifecycle import Lifecycle
+from state import MemoryStateStore
+
+
+@pytest.fixture
+def lifecycle():
+    handlers = {
+        name: signal.getsignal(getattr(signal, name))
+        for name in ('SIGTERM', 'SIGINT', 'SIGHUP')
+    }
+    yield Lifecycle().install()
+    for name, handler in handlers.items():
+        signal.signal(getattr(signal, name), handler)
+
+
+class TestLifecycle:
+
+    def test_stop_wakes_up_wait(self):
+        lifecycle = Lifecycle()
+        threading.Timer(0.05, lifecycle.stop).start()
+        started = time.monotonic()
+        assert lifecycle.wait(10) is False
+        assert time.monotonic() - started < 5, (
+            'Check that a stop request interrupts the sleep'
+        )
+
+    def test_signals(self, lifecycle):
+        os.kill(os.getpid(), signal.SIGHUP)
+        assert lifecycle.wait(1) is True
+        assert lifecycle.take_reload() is True
+        assert lifecycle.take_reload() is False
+        os.kill(os.getpid(), signal.SIGTERM)
+        assert lifecycle.wait(1) is False
+        with pytest.raises(KeyboardInterrupt):
+            os.kill(os.getpid(), signal.SIGTERM)
+
+    def test_listeners(self):
+        lifecycle = Lifecycle()
+        calls = []
+        lifecycle.add_listener(lambda: calls.append(1))
+        lifecycle.reload()
+        lifecycle.stop()
+        assert calls == [1, 1]
+
+
+class TestRunAccounts:
+
+    def test_reload_and_stop(self, monkeypatch):
+        polled = []
+        monkeypatch.setattr(
+            homework, 'poll_account',
+            lambda outbox, account, store, policy: polled.append(account))
+        lifecycle = Lifecycle()
+        accounts = [Account('old', 'token', 1)]
+        fresh = [Account('old', 'new token', 1), Account('new', 'token', 2)]
+
+        def reload():
+            lifecycle.stop()
+            return fresh
+
+        lifecycle.reload()
+        homework.run_accounts(
+            None, accounts, MemoryStateStore(), lifecycle, reload)
+        assert accounts == fresh, (
+            'Check that the roster is replaced in place on reload'
+        )
+        assert polled == [], 'Check that no poll starts after a stop request'
+
+    def test_broken_roster_is_ignored(self):
+        def reload():
+            raise ValueError('broken roster')
+
+        assert homework.reload_roster(reload) is None
@@ -0,0 +1,33 @@
+import json
+import logging
+
+from logging_setup import JsonFormatter, setup_logging, stop_listener
+
+
+class TestLoggingSetup:
+
+    def test_json_formatter_extra_fields(self):
+        record = logging.LogRecord(
+            'homework', logging.ERROR, __file__, 1, 'Program crash', None,
+            None)
+        record.account = 'student'
+        data = json.loads(JsonFormatter().format(record))
+        assert data['message'] == 'Program crash'
+        assert data['level'] == 'ERROR'
+        assert data['account'] == 'student'
+        assert 'homework' not in data
+
+    def test_records_are_written_by_listener(self, tmp_path):
+        path = tmp_path / 'bot.log'
+        root = logging.getLogger()
+        handlers, level = list(root.handlers), root.level
+        listener = setup_logging(filename=str(path), json_format=True)
+        try:
+            logging.getLogger('test').info(
+                'Message sent', extra={'account': 'student'})
+        finally:
+            stop_listener(listener)
+            root.handlers, root.level = handlers, level
+        data = json.loads(path.read_text().splitlines()[-1])
+        assert data['message'] == 'Message sent'
+        assert data['account'] == 'student'
@@ -0,0 +1,24 @@
+import homework
+
+
+class TestMessages:
+
+    def test_build_messages_all_homeworks(self):
+        homeworks = [
+            {'homework_name': 'hw1', 'status': 'approved'},
+            {'homework_name': 'hw2', 'status': 'rejected'},
+        ]
+        texts = homework.build_messages(homeworks)
+        assert texts == [
+            f'{homework.parse_status(homeworks[0])}\n'
+            f'{homework.parse_status(homeworks[1])}'
+        ], 'Check that every homework gets into one batched message'
+
+    def test_join_messages_respects_limit(self):
+        texts = homework.join_messages(['a' * 6, 'b' * 3, 'c' * 4], limit=10)
+        assert texts == ['aaaaaa\nbbb', 'cccc']
+
+    def test_join_messages_splits_long_message(self):
+        texts = homework.join_messages(['x', 'y' * 25], limit=10)
+        assert texts == ['x', 'y' * 10, 'y' * 10, 'y' * 5]
+        assert all(len(text) <= 10 for text in texts)
@@ -0,0 +1,63 @@
+import urllib.request
+
+import homework
+from metrics import (REGISTRY, Counter, Gauge, Histogram, Registry,
+                     start_metrics_server)
+
+
+class TestMetrics:
+
+    def test_render_counter_and_gauge(self):
+        registry = Registry()
+        errors = Counter('errors_total', 'Errors', ['exception'],
+                         registry=registry)
+        errors.inc('KeyError')
+        errors.inc('KeyError')
+        errors.inc('Type"Error')
+        Gauge('queue', 'Queue depth', function=lambda: 3, registry=registry)
+        text = registry.render()
+        assert '# TYPE errors_total counter' in text
+        assert 'errors_total{exception="KeyError"} 2' in text
+        assert 'errors_total{exception="Type\\"Error"} 1' in text
+        assert 'queue 3' in text
+
+    def test_api_poll_results(self, monkeypatch):
+        client = homework.PracticumClient(
+            homework.ENDPOINT, breaker=homework.CircuitBreaker())
+        client.stats.update(
+            requests=3, changed=2, not_modified=1, bytes_saved=500)
+        monkeypatch.setattr(homework, 'api_client', client)
+        text = REGISTRY.render()
+        assert 'homework_api_polls_total{result="changed"} 2' in text
+        assert 'homework_api_polls_total{result="not_modified"} 1' in text
+        assert 'result="requests"' not in text, (
+            'Check that the poll results do not overlap'
+        )
+        assert 'result="bytes_saved"' not in text
+        assert 'homework_api_bytes_saved_total 500' in text
+
+    def test_histogram_buckets(self):
+        registry = Registry()
+        latency = Histogram('latency_seconds', 'Latency', buckets=(0.1, 1),
+                            registry=registry)
+        for value in (0.05, 0.5, 0.7, 3):
+            latency.observe(value)
+        text = registry.render()
+        assert 'latency_seconds_bucket{le="0.1"} 1' in text
+        assert 'latency_seconds_bucket{le="1"} 3' in text
+        assert 'latency_seconds_bucket{le="+Inf"} 4' in text
+        assert 'latency_seconds_count 4' in text
+        assert latency.count == 4
+
+    def test_metrics_server(self):
+        registry = Registry()
+        Counter('polls_total', 'Polls', registry=registry).inc()
+        server = start_metrics_server(0, registry, host='127.0.0.1')
+        try:
+            port = server.server_address[1]
+            url = f'http://127.0.0.1:{port}/metrics'
+            with urllib.request.urlopen(url) as response:
+                assert 'polls_total 1' in response.read().decode()
+        finally:
+            server.shutdown()
+            server.server_close()
@@ -0,0 +1,99 @@
+from outbox import ERROR_PRIORITY, Outbox, TokenBucket
+from utils import FakeClock
+
+
+class RetryAfterError(Exception):
+
+    def __init__(self, retry_after):
+        super().__init__('Flood control exceeded')
+        self.retry_after = retry_after
+
+
+class PermanentError(Exception):
+    pass
+
+
+class Recorder:
+
+    def __init__(self, errors=()):
+        self.sent = []
+        self.errors = list(errors)
+
+    def __call__(self, chat_id, text):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.sent.append((chat_id, text))
+
+
+class TestTokenBucket:
+
+    def test_rate(self):
+        clock = FakeClock()
+        bucket = TokenBucket(2, 1, clock)
+        assert bucket.wait_time() == 0
+        bucket.consume()
+        assert bucket.wait_time() == 0.5
+        clock.now = 0.5
+        assert bucket.wait_time() == 0
+
+
+class TestOutbox:
+
+    def test_status_before_errors(self):
+        recorder = Recorder()
+        outbox = Outbox(recorder, clock=FakeClock())
+        outbox.put(1, 'error', ERROR_PRIORITY)
+        outbox.put(2, 'status')
+        while outbox.send_next() is not None:
+            pass
+        assert recorder.sent == [(2, 'status'), (1, 'error')], (
+            'Check that status changes are sent before error notices'
+        )
+
+    def test_chat_rate_does_not_block_other_chats(self):
+        clock = FakeClock()
+        recorder = Recorder()
+        outbox = Outbox(recorder, chat_rate=1, clock=clock)
+        outbox.put(1, 'first')
+        outbox.put(1, 'second')
+        outbox.put(2, 'other')
+        assert outbox.send_next() == 0
+        assert outbox.send_next() == 0
+        assert outbox.send_next() == 1
+        assert recorder.sent == [(1, 'first'), (2, 'other')]
+        clock.now = 1
+        assert outbox.send_next() == 0
+        assert recorder.sent[-1] == (1, 'second')
+        assert len(outbox) == 0
+
+    def test_retry_after(self):
+        clock = FakeClock()
+        recorder = Recorder([RetryAfterError(30)])
+        outbox = Outbox(recorder, clock=clock)
+        outbox.put(1, 'text')
+        outbox.send_next()
+        assert len(outbox) == 1
+        clock.now = 29
+        assert outbox.send_next() == 1
+        clock.now = 30
+        outbox.send_next()
+        assert recorder.sent == [(1, 'text')]
+
+    def test_give_up(self):
+        recorder = Recorder([PermanentError('chat not found')])
+        outbox = Outbox(recorder, give_up_on=(PermanentError,),
+                        clock=FakeClock())
+        outbox.put(1, 'text')
+        outbox.send_next()
+        assert len(outbox) == 0
+        assert recorder.sent == []
+
+    def test_stop_drains_queue(self):
+        recorder = Recorder()
+        outbox = Outbox(recorder, chat_rate=1000)
+        outbox.start()
+        for number in range(5):
+            outbox.put(1, str(number))
+        assert outbox.stop(timeout=5) == 0
+        assert [text for _, text in recorder.sent] == [
+            '0', '1', '2', '3', '4']
@@ -0,0 +1,127 @@
+import random
+import threading
+from types import SimpleNamespace
+
+import homework
+from accounts import Account
+from scheduler import AdaptivePolicy, PollScheduler
+from state import MemoryStateStore
+from utils import FakeClock
+
+
+class TestPollScheduler:
+
+    def test_pop_due_in_time_order(self):
+        clock = FakeClock()
+        scheduler = PollScheduler(clock=clock)
+        scheduler.schedule('late', 20)
+        scheduler.schedule('early', 10)
+        assert scheduler.time_until_next() == 10
+        assert scheduler.pop_due() == []
+        clock.now = 25
+        assert scheduler.pop_due() == ['early', 'late'], (
+            'Check that due accounts are returned in order of poll time'
+        )
+        assert len(scheduler) == 0
+        assert scheduler.time_until_next() is None
+
+    def test_update_keeps_poll_times(self):
+        clock = FakeClock()
+        scheduler = PollScheduler(clock=clock)
+        scheduler.schedule('first', 10)
+        scheduler.schedule('second', 20)
+        scheduler.update(
+            lambda account: None if account == 'first' else account.upper())
+        assert scheduler.time_until_next() == 20, (
+            'Check that a replaced account keeps its poll time'
+        )
+        clock.now = 20
+        assert scheduler.pop_due() == ['SECOND']
+
+
+class TestAdaptivePolicy:
+
+    def create_policy(self, **kwargs):
+        return AdaptivePolicy(600, 60, 3600, **kwargs)
+
+    def test_idle_backoff(self):
+        policy = self.create_policy(jitter=0)
+        delays = [policy.on_success('acc', []) for _ in range(5)]
+        assert delays == [600, 1200, 2400, 3600, 3600], (
+            'Check that idle accounts back off exponentially up to the limit'
+        )
+        assert policy.on_success('acc', ['approved']) == 600
+
+    def test_reviewing_is_polled_faster(self):
+        policy = self.create_policy(jitter=0)
+        assert policy.on_success('acc', ['reviewing']) == 60
+        assert policy.on_success('acc', []) == 60, (
+            'Check that an account stays active until the review ends'
+        )
+        assert policy.on_success('acc', ['approved']) == 600
+
+    def test_active_while_any_homework_is_reviewed(self):
+        policy = self.create_policy(jitter=0)
+        policy.on_success('acc', ['reviewing'])
+        assert policy.on_success(
+            'acc', ['approved'], ['reviewing', 'approved']) == 60, (
+            'Check that an approved homework does not hide another review'
+        )
+        assert policy.on_success('acc', [], ['approved', 'approved']) == 600
+
+    def test_seed_from_saved_statuses(self):
+        policy = self.create_policy(jitter=0)
+        policy.seed('acc', ['approved', 'reviewing'])
+        policy.seed('idle', ['approved'])
+        assert policy.on_success('acc', []) == 60, (
+            'Check that a review known before a restart keeps the pace'
+        )
+        assert policy.on_success('idle', []) == 600
+
+    def test_schedule_accounts_seeds_policy(self):
+        store = MemoryStateStore()
+        store.set_status('acc', 'hw1', 'reviewing')
+        policy = self.create_policy(jitter=0)
+        homework.schedule_accounts(
+            PollScheduler(), store, policy, [Account('acc', 'token', 1)])
+        assert policy.on_success('acc', []) == 60
+
+    def test_due_accounts_are_polled_in_parallel(self, monkeypatch):
+        barrier = threading.Barrier(2, timeout=5)
+
+        def poll_account(outbox, account, store, policy):
+            barrier.wait()
+            return 60
+
+        monkeypatch.setattr(homework, 'poll_account', poll_account)
+        lifecycle = SimpleNamespace(stopping=threading.Event())
+        accounts = [Account('first', 'token', 1),
+                    Account('second', 'token', 2)]
+        delays = dict(homework.poll_due(
+            None, accounts, MemoryStateStore(), self.create_policy(),
+            lifecycle))
+        assert delays == {accounts[0]: 60, accounts[1]: 60}, (
+            'Check that a slow poll does not hold up the other accounts'
+        )
+
+    def test_no_polls_are_started_when_stopping(self):
+        lifecycle = SimpleNamespace(stopping=threading.Event())
+        lifecycle.stopping.set()
+        assert list(homework.poll_due(
+            None, [Account('acc', 'token', 1)], MemoryStateStore(),
+            self.create_policy(), lifecycle)) == []
+
+    def test_error_backoff_and_retry_after(self):
+        policy = self.create_policy(jitter=0)
+        assert policy.on_error('acc') == 600
+        assert policy.on_error('acc') == 1200
+        assert policy.on_error('acc', retry_after=5000) == 5000
+        policy.on_success('acc', [])
+        assert policy.on_error('acc') == 600
+
+    def test_jitter_is_reproducible(self):
+        first = self.create_policy(rng=random.Random(1))
+        second = self.create_policy(rng=random.Random(1))
+        delays = [first.on_success('acc', []) for _ in range(3)]
+        assert delays == [second.on_success('acc', []) for _ in range(3)]
+        assert 540 <= delays[0] <= 660
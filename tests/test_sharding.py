@@ -0,0 +1,74 @@
+import pytest
+
+from accounts import Account
+from sharding import (HashRing, claim_worker_index, shard_accounts,
+                      worker_name)
+
+ACCOUNTS = [
+    Account(f'student{number}', f'token{number}', number)
+    for number in range(300)
+]
+
+
+def owners(count):
+    ring = HashRing([worker_name(index) for index in range(count)])
+    return {account.name: ring.node_for(account.name) for account in ACCOUNTS}
+
+
+class TestHashRing:
+
+    def test_node_for_is_deterministic(self):
+        first = HashRing(['a', 'b', 'c'])
+        second = HashRing(['c', 'a', 'b'])
+        assert all(
+            first.node_for(account.name) == second.node_for(account.name)
+            for account in ACCOUNTS
+        ), 'Check that the owner does not depend on the node order'
+
+    def test_adding_worker_moves_few_accounts(self):
+        before = owners(4)
+        after = owners(5)
+        moved = [name for name in before if before[name] != after[name]]
+        assert all(after[name] == worker_name(4) for name in moved), (
+            'Check that accounts only move to the new worker'
+        )
+        assert len(moved) < len(ACCOUNTS) / 3
+
+    def test_remove_node(self):
+        ring = HashRing(['a', 'b'])
+        ring.remove('b')
+        assert {ring.node_for(account.name) for account in ACCOUNTS} == {'a'}
+        ring.remove('a')
+        with pytest.raises(LookupError):
+            ring.node_for('student1')
+
+
+class TestShardAccounts:
+
+    def test_every_account_has_one_worker(self):
+        shards = [shard_accounts(ACCOUNTS, index, 3) for index in range(3)]
+        names = [account.name for shard in shards for account in shard]
+        assert sorted(names) == sorted(account.name for account in ACCOUNTS), (
+            'Check that each account is polled by exactly one worker'
+        )
+        assert all(shards), 'Check that every worker gets some accounts'
+
+    def test_index_out_of_range(self):
+        with pytest.raises(ValueError):
+            shard_accounts(ACCOUNTS, 3, 3)
+
+
+class TestClaimWorkerIndex:
+
+    def test_claims_free_slots(self, tmp_path):
+        path = str(tmp_path / 'worker.lock')
+        first, first_lock = claim_worker_index(path, 2)
+        second, second_lock = claim_worker_index(path, 2)
+        assert (first, second) == (0, 1)
+        with pytest.raises(RuntimeError):
+            claim_worker_index(path, 2)
+        first_lock.close()
+        index, lock = claim_worker_index(path, 2)
+        assert index == 0, 'Check that a released slot can be claimed again'
+        lock.close()
+        second_lock.close()
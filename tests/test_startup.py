@@ -0,0 +1,98 @@
+import logging
+import os
+import subprocess
+import sys
+from os.path import abspath, dirname
+
+import pytest
+
+import homework
+from lazy import lazy_import
+from logging_setup import stop_listener
+
+ROOT = dirname(dirname(abspath(__file__)))
+
+
+class TestLazyImport:
+
+    def test_module_is_loaded_on_access(self):
+        sys.modules.pop('colorsys', None)
+        module = lazy_import('colorsys')
+        assert sys.modules['colorsys'] is module
+        assert module.rgb_to_hsv(1, 0, 0) == (0, 1, 1)
+
+    def test_missing_module(self):
+        assert lazy_import('no_such_module_for_tests') is None
+
+    def test_heavy_modules_are_not_imported(self):
+        code = (
+            'import sys, homework\n'
+            'for name in ("asyncio", "aiohttp", "requests", "telegram"):\n'
+            '    module = sys.modules.get(name)\n'
+            '    if module is not None and '
+            'type(module).__name__ != "_LazyModule":\n'
+            '        print(name)\n')
+        result = subprocess.run(
+            [sys.executable, '-c', code], capture_output=True, text=True,
+            check=True, cwd=ROOT)
+        assert result.stdout == '', (
+            'Check that importing homework does not load heavy dependencies'
+        )
+
+    def test_environment_is_read_by_create_app(self):
+        code = 'import homework\nprint(homework.MAX_CONNECTIONS)\n'
+        result = subprocess.run(
+            [sys.executable, '-c', code], capture_output=True, text=True,
+            check=True, cwd=ROOT, env={**os.environ, 'MAX_CONNECTIONS': '7'})
+        assert result.stdout == '100\n', (
+            'Check that importing homework does not read the environment'
+        )
+
+
+class TestCreateApp:
+
+    def test_config_replaces_settings(self, monkeypatch, tmp_path):
+        for name in ('JOURNAL_DIR', 'LOG_FILE', 'REQUEST_TIMEOUT',
+                     'api_client', 'journal'):
+            monkeypatch.setattr(homework, name, getattr(homework, name))
+        handlers = list(logging.getLogger().handlers)
+        listener = homework.create_app({
+            'JOURNAL_DIR': str(tmp_path), 'LOG_FILE': '',
+            'REQUEST_TIMEOUT': 3,
+        })
+        try:
+            assert homework.journal.directory == str(tmp_path)
+            assert homework.api_client.timeout == 3
+        finally:
+            stop_listener(listener)
+            logging.getLogger().handlers = handlers
+
+    def test_settings_from_environment(self, monkeypatch, tmp_path):
+        for name in ('JOURNAL_DIR', 'LOG_FILE', 'ENDPOINT', 'MAX_CONNECTIONS',
+                     'api_client', 'journal'):
+            monkeypatch.setattr(homework, name, getattr(homework, name))
+        monkeypatch.setenv('PRACTICUM_ENDPOINT', 'http://localhost/api/')
+        monkeypatch.setenv('MAX_CONNECTIONS', '7')
+        monkeypatch.setenv('LOG_FILE', '')
+        handlers = list(logging.getLogger().handlers)
+        listener = homework.create_app({'JOURNAL_DIR': str(tmp_path)})
+        try:
+            assert homework.MAX_CONNECTIONS == 7
+            assert homework.api_client.endpoint == 'http://localhost/api/'
+        finally:
+            stop_listener(listener)
+            logging.getLogger().handlers = handlers
+
+    def test_flags(self):
+        settings = homework.read_settings({
+            'ASYNC_POLLING': 'false', 'TELEGRAM_COMMANDS': '1'})
+        assert settings == {'ASYNC_POLLING': False, 'TELEGRAM_COMMANDS': True}
+        for value in ('0', 'no', 'Off', ''):
+            assert not homework.read_settings(
+                {'ASYNC_POLLING': value})['ASYNC_POLLING'], (
+                'Check that a switched off flag does not enable the feature'
+            )
+
+    def test_unknown_setting(self):
+        with pytest.raises(KeyError):
+            homework.create_app({'NO_SUCH_SETTING': 1})
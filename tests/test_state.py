@@ -0,0 +1,89 @@
+import pytest
+
+from state import (FileStateStore, MemoryStateStore, SQLiteStateStore,
+                   open_state_store)
+from utils import FakeClock
+
+
+def fill(store):
+    store.set_cursor('student', 100)
+    store.set_status('student', '1', 'reviewing')
+    store.set_status('student', '1', 'approved')
+    store.set_status('other', '2', 'rejected')
+    store.set_error('student', 'Program crash: error')
+
+
+class TestStateStore:
+
+    @pytest.mark.parametrize('store_class', [FileStateStore, SQLiteStateStore])
+    def test_state_survives_restart(self, tmp_path, store_class):
+        path = str(tmp_path / 'state')
+        store = store_class(path)
+        fill(store)
+        store.close()
+
+        store = store_class(path)
+        assert store.get_cursor('student') == 100
+        assert store.get_status('student', '1') == 'approved'
+        assert store.get_statuses('other') == {'2': 'rejected'}
+        assert store.get_error('student') == 'Program crash: error'
+        assert store.get_error('other') == ''
+        store.close()
+
+    def test_statuses_by_account(self):
+        store = MemoryStateStore()
+        fill(store)
+        statuses = store.get_statuses('student')
+        statuses['3'] = 'approved'
+        assert store.get_status('student', '3') is None, (
+            'Check that get_statuses returns a copy of the statuses'
+        )
+        assert store.get_statuses('nobody') == {}
+
+    def test_flush_is_batched(self, tmp_path):
+        clock = FakeClock()
+        path = tmp_path / 'state.log'
+        store = FileStateStore(str(path), flush_interval=5, clock=clock)
+        fill(store)
+        store.flush()
+        assert path.read_text() == '', (
+            'Check that changes are not written on every poll'
+        )
+        clock.now = 5
+        store.flush()
+        assert len(path.read_text().splitlines()) == 5
+        store.close()
+
+    def test_file_store_compacts_on_open(self, tmp_path):
+        path = tmp_path / 'state.log'
+        store = FileStateStore(str(path))
+        for timestamp in range(10):
+            store.set_cursor('student', timestamp)
+        store.close()
+        store = FileStateStore(str(path))
+        assert store.get_cursor('student') == 9
+        store.close()
+        assert len(path.read_text().splitlines()) == 1
+
+    def test_file_store_cuts_torn_line(self, tmp_path):
+        path = tmp_path / 'state.jsonl'
+        store = FileStateStore(str(path))
+        store.set_cursor('student', 100)
+        store.close()
+        with open(path, 'a', encoding='utf-8') as file:
+            file.write('["cursor", "stud')
+        store = open_state_store(f'file:{path}')
+        assert store.get_cursor('student') == 100, (
+            'Check that a line cut short by a crash is dropped'
+        )
+        store.set_cursor('student', 200)
+        store.close()
+        assert FileStateStore(str(path)).get_cursor('student') == 200
+
+    def test_open_state_store(self, tmp_path):
+        assert type(open_state_store(None)) is MemoryStateStore
+        store = open_state_store(f'sqlite:{tmp_path / "state.db"}')
+        assert isinstance(store, SQLiteStateStore)
+        store.close()
+        with pytest.raises(ValueError):
+            open_state_store('redis:localhost')
@@ -0,0 +1,54 @@
+import json
+
+import homework
+from templates import TemplateRegistry
+
+
+def create_registry():
+    registry = TemplateRegistry('en')
+    registry.register('en', 'Status of "{homework_name}": {verdict}',
+                      {'approved': 'Approved {ok}', 'rejected': 'Rejected'})
+    registry.register('ru', verdicts={'approved': 'Принята'})
+    return registry.compile()
+
+
+class TestTemplates:
+
+    def test_default_locale_output(self):
+        for status, verdict in homework.HOMEWORK_STATUSES.items():
+            data = {'homework_name': 'hw1', 'status': status}
+            assert homework.parse_status(data) == (
+                f'Job verification status changed "hw1". {verdict}'
+            ), 'Check that the default message text has not changed'
+
+    def test_missing_name_as_before(self):
+        assert homework.parse_status({'status': 'approved'}) == (
+            'Job verification status changed "None". '
+            f'{homework.HOMEWORK_STATUSES["approved"]}'
+        ), 'Check that a missing homework name is rendered as before'
+
+    def test_render_locale_with_fallback(self):
+        registry = create_registry()
+        data = {'homework_name': 'hw{1}', 'status': 'approved'}
+        assert registry.render('en', data) == (
+            'Status of "hw{1}": Approved {ok}')
+        assert registry.render('ru', data) == 'Status of "hw{1}": Принята'
+        data['status'] = 'rejected'
+        assert registry.render('ru', data) == 'Status of "hw{1}": Rejected'
+        assert registry.render('de', data) == 'Status of "hw{1}": Rejected'
+
+    def test_load_templates_with_comments(self, tmp_path):
+        path = tmp_path / 'templates.json'
+        path.write_text(json.dumps({'en': {
+            'template': '{lesson_name}: {verdict} {reviewer_comment}'}}))
+        registry = create_registry().load(path).compile()
+        data = {'homework_name': 'hw1', 'status': 'rejected',
+                'lesson_name': 'Final project'}
+        assert registry.render('en', data) == 'Final project: Rejected '
+
+    def test_build_messages_in_russian(self):
+        data = {'homework_name': 'hw1', 'status': 'reviewing'}
+        assert homework.build_messages([data], 'ru') == [
+            'Изменился статус проверки работы "hw1". '
+            'Работа взята на проверку ревьюером.'
+        ]
@@ -0,0 +1,142 @@
+import inspect
+import json
+import random
+
+import homework
+from outbox import Outbox
+from tracing import JsonFileExporter, OTLPExporter, Tracer, otlp_span
+from utils import MockSession
+
+
+class ListExporter:
+
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span):
+        self.spans.append(span)
+
+    def close(self):
+        pass
+
+
+def create_tracer(sample_rate=1.0):
+    exporter = ListExporter()
+    return Tracer(exporter, sample_rate, rng=random.Random(1)), exporter
+
+
+class TestTracer:
+
+    def test_child_spans(self):
+        tracer, exporter = create_tracer()
+        with tracer.span('poll', account='student') as poll:
+            with tracer.span('check_response') as check:
+                pass
+        assert [span.name for span in exporter.spans] == [
+            'check_response', 'poll']
+        assert check.trace_id == poll.trace_id
+        assert check.parent_id == poll.span_id
+        assert check.attributes == {'account': 'student'}, (
+            'Check that the account is inherited by the child spans'
+        )
+        assert poll.start <= check.start <= check.end <= poll.end
+
+    def test_error_is_recorded(self):
+        tracer, exporter = create_tracer()
+        try:
+            with tracer.span('poll'):
+                raise ValueError('broken')
+        except ValueError:
+            pass
+        assert exporter.spans[0].error == 'ValueError: broken'
+
+    def test_sampling(self):
+        tracer, exporter = create_tracer(sample_rate=0)
+        with tracer.span('poll'):
+            with tracer.span('check_response'):
+                pass
+        assert exporter.spans == []
+        tracer.configure(exporter, 1)
+        with tracer.span('poll'):
+            pass
+        assert len(exporter.spans) == 1
+
+    def test_no_exporter(self):
+        tracer = Tracer()
+        with tracer.span('poll') as span:
+            pass
+        assert not span.sampled
+
+    def test_traced_keeps_signature(self):
+        tracer, exporter = create_tracer()
+
+        @tracer.traced('parse_status', lambda homework: {'homework': 'hw'})
+        def parse(homework):
+            return homework
+
+        assert parse('answer') == 'answer'
+        assert list(inspect.signature(parse).parameters) == ['homework']
+        assert exporter.spans[0].attributes == {'homework': 'hw'}
+        for name in ('get_api_answer', 'parse_status', 'check_response'):
+            assert len(inspect.signature(
+                getattr(homework, name)).parameters) == 1
+
+    def test_queued_message_is_linked_to_poll(self):
+        tracer, exporter = create_tracer()
+
+        def deliver(chat_id, text):
+            with tracer.span('send_message', chat_id=chat_id):
+                pass
+
+        outbox = Outbox(deliver, global_rate=1000, chat_rate=1000)
+        with tracer.span('poll', account='student') as poll:
+            outbox.put(1, 'text')
+        outbox.send_next()
+        send = exporter.spans[-1]
+        assert send.name == 'send_message'
+        assert send.trace_id != poll.trace_id
+        assert send.links == ((poll.trace_id, poll.span_id),), (
+            'Check that a send is linked to the poll that queued it'
+        )
+
+
+class TestExporters:
+
+    def test_json_file(self, tmp_path):
+        path = tmp_path / 'spans.jsonl'
+        exporter = JsonFileExporter(str(path))
+        tracer = Tracer(exporter)
+        with tracer.span('poll', account='student'):
+            pass
+        tracer.close()
+        span = json.loads(path.read_text(encoding='utf-8'))
+        assert span['name'] == 'poll'
+        assert span['attributes'] == {'account': 'student'}
+
+    def test_otlp(self):
+        session = MockSession()
+        exporter = OTLPExporter(
+            'http://collector:4318/', session=session, interval=0.01)
+        tracer = Tracer(exporter)
+        with tracer.span('poll', account='student', attempts=2):
+            with tracer.span('check_response'):
+                pass
+        tracer.close()
+        call = session.calls[0]
+        assert call['url'] == 'http://collector:4318/v1/traces'
+        spans = call['json']['resourceSpans'][0]['scopeSpans'][0]['spans']
+        child, parent = spans
+        assert child['parentSpanId'] == parent['spanId']
+        assert {'key': 'attempts', 'value': {'intValue': '2'}} in (
+            parent['attributes'])
+
+    def test_otlp_span_error(self):
+        tracer, exporter = create_tracer()
+        try:
+            with tracer.span('poll'):
+                raise ValueError('broken')
+        except ValueError:
+            pass
+        span = otlp_span(exporter.spans[0])
+        assert span['status'] == {'code': 2, 'message': 'ValueError: broken'}
+        assert 'parentSpanId' not in span
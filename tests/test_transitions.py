@@ -0,0 +1,51 @@
+from state import MemoryStateStore
+from transitions import (apply_transitions, find_transitions, homework_key,
+                         replay)
+
+
+class TestTransitions:
+
+    def test_only_real_changes(self):
+        store = MemoryStateStore()
+        homeworks = [
+            {'id': 1, 'homework_name': 'hw1', 'status': 'reviewing'},
+            {'id': 2, 'homework_name': 'hw2', 'status': 'approved'},
+        ]
+        transitions = find_transitions(store, 'student', homeworks)
+        assert [t.status for t in transitions] == ['reviewing', 'approved']
+        assert store.get_status('student', 'hw1') is None, (
+            'Check that statuses are saved only by apply_transitions'
+        )
+        apply_transitions(store, 'student', transitions)
+
+        assert find_transitions(store, 'student', homeworks) == [], (
+            'Check that a repeated answer does not produce notifications'
+        )
+        homeworks[0] = dict(homeworks[0], status='approved')
+        transitions = find_transitions(store, 'student', homeworks)
+        assert len(transitions) == 1
+        assert transitions[0].old_status == 'reviewing'
+        assert transitions[0].status == 'approved'
+
+    def test_accounts_are_separate(self):
+        store = MemoryStateStore()
+        homework = {'id': 1, 'homework_name': 'hw1', 'status': 'reviewing'}
+        apply_transitions(
+            store, 'first', find_transitions(store, 'first', [homework]))
+        assert find_transitions(store, 'second', [homework])
+
+    def test_homework_key(self):
+        assert homework_key({'id': 7, 'homework_name': 'hw'}) == 'hw'
+        assert homework_key({'id': 7}) == '7'
+
+    def test_replay(self):
+        store = MemoryStateStore()
+        events = [
+            ('student', {'homework_name': 'hw1', 'status': 'reviewing'}),
+            ('student', {'homework_name': 'hw1', 'status': 'reviewing'}),
+            ('student', {'homework_name': 'hw1', 'status': 'approved'}),
+        ]
+        transitions = replay(store, events)
+        assert [(t.old_status, t.status) for t in transitions] == [
+            (None, 'reviewing'), ('reviewing', 'approved')]
+        assert store.get_status('student', 'hw1') == 'approved'
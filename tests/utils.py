@@ -1,3 +1,5 @@
+import json
+from http import HTTPStatus
 from inspect import signature
 from types import ModuleType
 
@@ -37,3 +39,58 @@ def check_default_var_exists(scope: ModuleType, var_name: str) -> None:
         f'{var_name} must be a variable, not a function.'
     )
 
+
+class FakeClock:
+    """Clock for tests that moves by step on every call."""
+
+    def __init__(self, step: float = 0):
+        self.now = 0
+        self.step = step
+
+    def __call__(self):
+        self.now += self.step
+        return self.now
+
+
+class MockResponse:
+    """Answer of a mocked HTTP session."""
+
+    def __init__(self, status_code=HTTPStatus.OK, data=None, headers=None):
+        self.status_code = status_code
+        self.data = data
+        self.headers = headers or {}
+
+    def json(self):
+        return self.data
+
+    def raise_for_status(self):
+        pass
+
+
+class MockBodyResponse(MockResponse):
+    """Answer of a mocked HTTP session with a JSON body."""
+
+    def __init__(self, data, **kwargs):
+        super().__init__(data=data, **kwargs)
+        self.content = json.dumps(data).encode()
+        self.decoded = 0
+
+    def json(self):
+        self.decoded += 1
+        return json.loads(self.content)
+
+
+class MockSession:
+    """HTTP session that records the requests and returns response."""
+
+    def __init__(self, response=None):
+        self.response = response or MockResponse()
+        self.calls = []
+
+    def get(self, **kwargs):
+        self.calls.append(kwargs)
+        return self.response
+
+    def post(self, url, **kwargs):
+        self.calls.append({'url': url, **kwargs})
+        return self.response
@@ -0,0 +1,294 @@
+"""Module for tracing the phases of polls and notifications."""
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from lazy import lazy_import
+
+requests = lazy_import('requests')
+
+SERVICE_NAME = 'homework-bot'
+INHERITED_ATTRIBUTES = ('account',)
+
+logger = logging.getLogger(__name__)
+
+current_span = contextvars.ContextVar('current_span', default=None)
+
+
+class Span:
+    """One timed phase of a trace.
+
+    A span that starts after its parent has ended, like a message
+    sent by the outbox after the poll that queued it, begins a new
+    trace linked to the parent instead.
+    """
+
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'sampled',
+                 'start', 'end', 'attributes', 'links', 'error')
+
+    def __init__(self, name, trace_id, span_id, parent_id, sampled,
+                 attributes, links):
+        """Creates a span; the tracer sets its times."""
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.attributes = attributes
+        self.links = links
+        self.start = None
+        self.end = None
+        self.error = None
+
+    def set(self, **attributes):
+        """Adds attributes to the span."""
+        self.attributes.update(attributes)
+
+    def to_dict(self):
+        """Returns the span as a JSON-compatible dictionary."""
+        return {
+            'name': self.name, 'trace_id': self.trace_id,
+            'span_id': self.span_id, 'parent_id': self.parent_id,
+            'start': self.start, 'end': self.end,
+            'attributes': self.attributes,
+            'links': [
+                {'trace_id': trace_id, 'span_id': span_id}
+                for trace_id, span_id in self.links
+            ],
+            'error': self.error,
+        }
+
+
+class Tracer:
+    """Records the spans of sampled traces and passes them to exporter.
+
+    The decision to sample is made once per trace with sample_rate,
+    so an unsampled poll costs only a context variable switch.
+    Without an exporter nothing is sampled.
+    """
+
+    def __init__(self, exporter=None, sample_rate=1.0, rng=None,
+                 clock=time.time):
+        """Samples nothing until an exporter is set."""
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.rng = rng or random.Random()
+        self._clock = clock
+
+    def configure(self, exporter, sample_rate=None):
+        """Replaces the exporter and the share of sampled traces."""
+        self.exporter = exporter
+        if sample_rate is not None:
+            self.sample_rate = sample_rate
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """Times the block as a span of the current trace."""
+        span = self._start(name, attributes)
+        token = current_span.set(span)
+        try:
+            yield span
+        except BaseException as error:
+            span.error = f'{type(error).__name__}: {error}'
+            raise
+        finally:
+            current_span.reset(token)
+            span.end = self._clock()
+            if span.sampled:
+                self.exporter.export(span)
+
+    def traced(self, name, attributes=None):
+        """Wraps every call of a function in a span.
+
+        attributes is called with the arguments of the function and
+        returns the attributes of the span. The signature of the
+        function is kept. Without an exporter the function is called
+        directly.
+        """
+        def decorator(function):
+            if inspect.iscoroutinefunction(function):
+                @functools.wraps(function)
+                async def wrapper(*args, **kwargs):
+                    if self.exporter is None:
+                        return await function(*args, **kwargs)
+                    with self.span(name, **self._attributes(
+                            attributes, args, kwargs)):
+                        return await function(*args, **kwargs)
+            else:
+                @functools.wraps(function)
+                def wrapper(*args, **kwargs):
+                    if self.exporter is None:
+                        return function(*args, **kwargs)
+                    with self.span(name, **self._attributes(
+                            attributes, args, kwargs)):
+                        return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def close(self):
+        """Sends the spans left in the exporter."""
+        if self.exporter is not None:
+            self.exporter.close()
+
+    @staticmethod
+    def _attributes(attributes, args, kwargs):
+        if attributes is None:
+            return {}
+        return attributes(*args, **kwargs)
+
+    def _start(self, name, attributes):
+        parent = current_span.get()
+        links = ()
+        if parent is not None and parent.end is not None:
+            links = ((parent.trace_id, parent.span_id),)
+            sampled = parent.sampled
+            parent = None
+        if parent is None:
+            if not links:
+                sampled = (self.exporter is not None
+                           and self.rng.random() < self.sample_rate)
+            trace_id = f'{self.rng.getrandbits(128):032x}' if sampled else ''
+            parent_id = None
+        else:
+            sampled = parent.sampled
+            trace_id = parent.trace_id
+            parent_id = parent.span_id
+            for key in INHERITED_ATTRIBUTES:
+                if key in parent.attributes:
+                    attributes.setdefault(key, parent.attributes[key])
+        span_id = f'{self.rng.getrandbits(64):016x}' if sampled else ''
+        span = Span(name, trace_id, span_id, parent_id, sampled,
+                    attributes, links)
+        if sampled:
+            span.start = self._clock()
+        return span
+
+
+class JsonFileExporter:
+    """Appends finished spans to a file as JSON lines."""
+
+    def __init__(self, path):
+        """Opens the file for appending."""
+        self._file = open(path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def export(self, span):
+        """Writes one span."""
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(f'{line}\n')
+            self._file.flush()
+
+    def close(self):
+        """Closes the file."""
+        with self._lock:
+            self._file.close()
+
+
+def otlp_value(value):
+    """Converts an attribute value to the OTLP JSON form."""
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def otlp_span(span):
+    """Converts a span to the OTLP JSON form."""
+    result = {
+        'traceId': span.trace_id,
+        'spanId': span.span_id,
+        'name': span.name,
+        'kind': 1,
+        'startTimeUnixNano': str(int(span.start * 1e9)),
+        'endTimeUnixNano': str(int(span.end * 1e9)),
+        'attributes': [
+            {'key': key, 'value': otlp_value(value)}
+            for key, value in span.attributes.items() if value is not None
+        ],
+        'links': [
+            {'traceId': trace_id, 'spanId': span_id}
+            for trace_id, span_id in span.links
+        ],
+    }
+    if span.parent_id:
+        result['parentSpanId'] = span.parent_id
+    if span.error:
+        result['status'] = {'code': 2, 'message': span.error}
+    return result
+
+
+class OTLPExporter:
+    """Sends spans to an OpenTelemetry collector over OTLP/HTTP JSON.
+
+    Spans are collected by a background thread and posted to
+    endpoint/v1/traces in batches of up to batch_size or every
+    interval seconds. A failed batch is logged and dropped.
+    """
+
+    def __init__(self, endpoint, session=None, batch_size=512, interval=5,
+                 timeout=10):
+        """Starts the thread sending the batches."""
+        self.url = f'{endpoint.rstrip("/")}/v1/traces'
+        self.session = session if session is not None else requests
+        self.batch_size = batch_size
+        self.interval = interval
+        self.timeout = timeout
+        self._spans = queue.SimpleQueue()
+        self._thread = threading.Thread(
+            target=self._run, name='otlp-exporter', daemon=True)
+        self._thread.start()
+
+    def export(self, span):
+        """Queues one span."""
+        self._spans.put(span)
+
+    def close(self, timeout=None):
+        """Sends the queued spans and stops the thread."""
+        self._spans.put(None)
+        self._thread.join(timeout)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batch_size:
+                try:
+                    span = self._spans.get(
+                        timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if span is None:
+                    stopping = True
+                    break
+                batch.append(span)
+            if batch:
+                self._send(batch)
+
+    def _send(self, batch):
+        payload = {'resourceSpans': [{
+            'resource': {'attributes': [
+                {'key': 'service.name',
+                 'value': otlp_value(SERVICE_NAME)}]},
+            'scopeSpans': [{
+                'scope': {'name': 'homework'},
+                'spans': [otlp_span(span) for span in batch],
+            }],
+        }]}
+        try:
+            response = self.session.post(
+                self.url, json=payload, timeout=self.timeout)
+            response.raise_for_status()
+        except Exception as error:
+            logger.warning(f'Cannot export {len(batch)} spans: {error}')
@@ -0,0 +1,45 @@
+"""Module for finding real changes of homework statuses."""
+from collections import namedtuple
+
+Transition = namedtuple('Transition', ['homework', 'old_status', 'status'])
+
+
+def homework_key(homework):
+    """Returns the key identifying the homework in the state store."""
+    return str(homework.get('homework_name') or homework.get('id'))
+
+
+def find_transitions(store, account, homeworks):
+    """Returns the homeworks whose status differs from the known one.
+
+    The store is not changed, apply_transitions saves the new
+    statuses once they have been reported.
+    """
+    transitions = []
+    for homework in homeworks:
+        status = homework.get('status')
+        old_status = store.get_status(account, homework_key(homework))
+        if old_status != status:
+            transitions.append(Transition(homework, old_status, status))
+    return transitions
+
+
+def apply_transitions(store, account, transitions):
+    """Saves the new statuses of the homeworks."""
+    for transition in transitions:
+        store.set_status(
+            account, homework_key(transition.homework), transition.status)
+
+
+def replay(store, events):
+    """Rebuilds the known statuses from (account, homework) events.
+
+    Events go in the order they were received. Returns the
+    transitions found on the way.
+    """
+    found = []
+    for account, homework in events:
+        transitions = find_transitions(store, account, [homework])
+        apply_transitions(store, account, transitions)
+        found.extend(transitions)
+    return found